@@ -0,0 +1,335 @@
+"""Benchmark suite for Bisheng Lite.
+
+Starts the app and a stub LLM provider in-process (each uvicorn server on its
+own thread and event loop), drives flow CRUD, flow listing at several table
+sizes and concurrent chat WebSocket runs, and prints throughput and
+p50/p95/p99 latencies as JSON.
+
+    python bench/run.py --output bench.json
+    python bench/run.py --baseline bench.json --threshold 0.15
+
+With --baseline the run is compared against an earlier result file and the
+exit code is 1 when any scenario regressed by more than the threshold.
+Numbers are meant for comparing two builds on the same machine, not as
+absolute capacity figures.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def configure_env(workdir: str, stub_port: int):
+    # Must run before the app is imported: settings are read at import time.
+    # Limits are relaxed so the benchmark measures the code, not the limiter's refusals.
+    os.environ.update({
+        "DATABASE_FILE": os.path.join(workdir, "bench.db"),
+        "LLM_CACHE_DB": os.path.join(workdir, "llm_cache.db"),
+        "GROQ_API_BASE": f"http://127.0.0.1:{stub_port}",
+        "GROQ_API_KEY": "bench",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+        "RATE_LIMIT": "100000000",
+        "WS_RATE_LIMIT": "100000000",
+        "WS_MESSAGE_RATE_LIMIT": "100000000",
+        "LLM_RATE_PER_MINUTE": "100000000",
+        "LLM_BURST": "100000",
+        "LLM_MAX_CONCURRENCY": "1024",
+    })
+
+class ServerThread:
+    def __init__(self, app, port: int):
+        import uvicorn
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError(f"Server on port {self.port} failed to start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "throughput": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": ms(sum(values) / len(values)) if values else 0.0,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else 0.0,
+    }
+
+async def measure(op: Callable[[int], Awaitable[None]], count: int, concurrency: int) -> Dict:
+    # Run `op(i)` for i in range(count) on `concurrency` workers, timing each call
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await op(i)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+FLOW_GRAPH = {
+    "nodes": [
+        {"id": "node_input_1", "type": "InputNode", "data": {"type": "input"}},
+        {"id": "node_llm_1", "type": "LLMNode", "data": {"model_name": "groq/llama3-8b-8192"}}
+    ],
+    "edges": [{"source": "node_input_1", "target": "node_llm_1"}]
+}
+
+async def bench_crud(client, args) -> Dict[str, Dict]:
+    results = {}
+    ids: List[Optional[str]] = [None] * args.requests
+
+    async def create(i):
+        response = await client.post("/api/v1/flows/", json={"name": f"bench crud {i}", "data": FLOW_GRAPH})
+        response.raise_for_status()
+        ids[i] = response.json()["id"]
+
+    async def read(i):
+        (await client.get(f"/api/v1/flows/{ids[i]}")).raise_for_status()
+
+    async def update(i):
+        payload = {"name": f"bench crud {i} v2", "data": FLOW_GRAPH}
+        (await client.patch(f"/api/v1/flows/{ids[i]}", json=payload)).raise_for_status()
+
+    async def delete(i):
+        (await client.delete(f"/api/v1/flows/{ids[i]}")).raise_for_status()
+
+    for name, op in (("create", create), ("read", read), ("update", update), ("delete", delete)):
+        results[f"crud.{name}"] = await measure(op, args.requests, args.concurrency)
+    return results
+
+def seed_flows(count: int, start: int):
+    # Straight into the app's database: going through the API would dominate setup time
+    from sqlmodel import Session
+    from database import engine
+    from models import Flow
+
+    now = datetime.now()
+    with Session(engine) as session:
+        for i in range(start, start + count):
+            stamp = now.replace(microsecond=i % 1000000).isoformat()
+            session.add(Flow(
+                id=str(uuid.uuid4()), name=f"seeded flow {i} {'alpha' if i % 10 == 0 else 'beta'}",
+                description="benchmark seed", data=FLOW_GRAPH, update_time=stamp, create_time=stamp
+            ))
+        session.commit()
+
+async def bench_list(client, args) -> Dict[str, Dict]:
+    results = {}
+    seeded = 0
+    for size in sorted(args.list_sizes):
+        if size > seeded:
+            await asyncio.to_thread(seed_flows, size - seeded, seeded)
+            seeded = size
+
+        first = await client.get("/api/v1/flows/", params={"page_size": args.page_size})
+        first.raise_for_status()
+        cursor = first.json().get("next_cursor")
+
+        async def first_page(i):
+            (await client.get("/api/v1/flows/", params={"page_size": args.page_size})).raise_for_status()
+
+        async def cursor_page(i):
+            params = {"page_size": args.page_size, "cursor": cursor}
+            (await client.get("/api/v1/flows/", params=params)).raise_for_status()
+
+        async def deep_offset_page(i):
+            params = {"page_size": args.page_size, "page_num": max(1, size // args.page_size // 2)}
+            (await client.get("/api/v1/flows/", params=params)).raise_for_status()
+
+        async def search(i):
+            params = {"page_size": args.page_size, "name": "alpha"}
+            (await client.get("/api/v1/flows/", params=params)).raise_for_status()
+
+        for name, op in (("first_page", first_page), ("cursor_page", cursor_page),
+                         ("offset_page", deep_offset_page), ("search", search)):
+            results[f"list.{size}.{name}"] = await measure(op, args.requests, args.concurrency)
+    return results
+
+async def bench_chat(client, args, base_ws: str) -> Dict[str, Dict]:
+    import websockets
+
+    response = await client.post("/api/v1/flows/", json={"name": "bench chat", "data": FLOW_GRAPH})
+    response.raise_for_status()
+    flow_id = response.json()["id"]
+    first_token: List[float] = []
+
+    async def chat(i):
+        async with websockets.connect(f"{base_ws}/api/v1/workflow/chat/{flow_id}") as ws:
+            await ws.send(json.dumps({"action": "init_data", "chat_id": f"bench-{i}"}))
+            sent = None
+            while True:
+                frame = json.loads(await ws.recv())
+                if frame.get("category") == "input":
+                    sent = time.perf_counter()
+                    await ws.send(json.dumps({
+                        "action": "input", "chat_id": f"bench-{i}",
+                        "data": {"node_input_1": {"message": f"benchmark question {i}"}}
+                    }))
+                elif frame.get("category") == "stream_msg" and frame.get("type") == "stream" and sent:
+                    first_token.append(time.perf_counter() - sent)
+                    sent = None
+                elif frame.get("category") == "error":
+                    raise RuntimeError(frame.get("message"))
+                elif frame.get("type") == "close":
+                    return
+
+    runs = await measure(chat, args.chat_runs, args.chat_concurrency)
+    return {
+        "chat.run": runs,
+        "chat.first_token": summarize(first_token, 0, 0),
+    }
+
+REGRESSION_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+def compare(current: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> Dict[str, Dict]:
+    # Ratios current/baseline; a scenario regresses when p95 grows or throughput
+    # drops by more than `threshold`
+    comparison = {}
+    for name, stats in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        entry = {}
+        for key in REGRESSION_KEYS:
+            entry[key] = round(stats[key] / base[key], 3) if base[key] else None
+        if stats["throughput"] and base["throughput"]:
+            entry["throughput"] = round(stats["throughput"] / base["throughput"], 3)
+        entry["regressed"] = bool(
+            (entry["p95_ms"] is not None and entry["p95_ms"] > 1 + threshold)
+            or (entry.get("throughput") is not None and entry["throughput"] < 1 - threshold)
+            or stats["errors"] > base["errors"]
+        )
+        comparison[name] = entry
+    return comparison
+
+async def run_benchmarks(args, app_port: int) -> Dict[str, Dict]:
+    import httpx
+
+    results: Dict[str, Dict] = {}
+    base_url = f"http://127.0.0.1:{app_port}"
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.chat_concurrency) * 2)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        if "crud" in args.scenarios:
+            results.update(await bench_crud(client, args))
+        if "list" in args.scenarios:
+            results.update(await bench_list(client, args))
+        if "chat" in args.scenarios:
+            results.update(await bench_chat(client, args, f"ws://127.0.0.1:{app_port}"))
+    return results
+
+def parse_args(argv=None):
+    csv_ints = lambda raw: [int(v) for v in raw.split(",") if v]
+    csv = lambda raw: [v for v in raw.split(",") if v]
+    parser = argparse.ArgumentParser(description="Bisheng Lite benchmark suite")
+    parser.add_argument("--scenarios", type=csv, default=["crud", "list", "chat"],
+                        help="comma-separated subset of crud,list,chat")
+    parser.add_argument("--requests", type=int, default=200, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent HTTP clients")
+    parser.add_argument("--list-sizes", type=csv_ints, default=[100, 1000, 10000],
+                        help="flow table sizes for the listing scenario")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--chat-runs", type=int, default=64, help="chat WebSocket runs")
+    parser.add_argument("--chat-concurrency", type=int, default=16, help="concurrent chat WebSockets")
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="stub LLM seconds to first token")
+    parser.add_argument("--stub-token-rate", type=float, default=100.0, help="stub LLM tokens per second")
+    parser.add_argument("--stub-tokens", type=int, default=32, help="stub LLM tokens per answer")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative p95/throughput change counted as a regression")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="bisheng-bench-")
+    stub_port, app_port = free_port(), free_port()
+    configure_env(workdir, stub_port)
+    sys.path.insert(0, ROOT)
+
+    from stub_llm import create_app
+    import main as app_module
+
+    stub = ServerThread(create_app(args.stub_latency, args.stub_token_rate, args.stub_tokens), stub_port)
+    server = ServerThread(app_module.app, app_port)
+    stub.start()
+    server.start()
+    try:
+        results = asyncio.run(run_benchmarks(args, app_port))
+    finally:
+        server.stop()
+        stub.stop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        report["comparison"] = compare(results, baseline, args.threshold)
+        regressed = [name for name, entry in report["comparison"].items() if entry["regressed"]]
+        if regressed:
+            print(f"Regressed: {', '.join(regressed)}", file=sys.stderr)
+            exit_code = 1
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import time
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# OpenAI-compatible /chat/completions stand-in for benchmarks: no key, no
+# network, deterministic timing. `latency` is the delay before the first
+# token, `token_rate` tokens per second after that, `tokens` the answer length.
+
+def create_app(latency: float = 0.2, token_rate: float = 100.0, tokens: int = 32) -> Starlette:
+    state = {"requests": 0}
+
+    def answer_tokens(body: dict):
+        prompt = str(body["messages"][-1]["content"])
+        return [f"tok{i}" if i else prompt[:16] for i in range(tokens)]
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        state["requests"] += 1
+        words = answer_tokens(body)
+        delay = 1.0 / token_rate if token_rate > 0 else 0.0
+
+        if body.get("stream"):
+            async def events():
+                await asyncio.sleep(latency)
+                for word in words:
+                    chunk = {
+                        "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": body["model"],
+                        "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    if delay:
+                        await asyncio.sleep(delay)
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(latency + delay * len(words))
+        return JSONResponse({
+            "id": "stub", "object": "chat.completion", "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+            "service_tier": None,
+            "system_fingerprint": None,
+            "usage": {"prompt_tokens": 1, "completion_tokens": len(words), "total_tokens": len(words) + 1}
+        })
+
+    app = Starlette(routes=[Route("/chat/completions", chat_completions, methods=["POST"])])
+    app.state.stats = state
+    return app
@@ -7,6 +7,91 @@ load_dotenv()
 
 class Settings(BaseSettings):
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
+    # SQLite database file, connection pool and pragmas
+    DATABASE_FILE: str = os.getenv("DATABASE_FILE", "bisheng_lite.db")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", "268435456"))
+    # Rate limits (requests per window seconds) for HTTP and WebSocket handshakes.
+    # RATE_LIMIT_ROUTES holds JSON per-path-prefix overrides: {"/api/v1/user/login": [10, 60]}
+    RATE_LIMIT: int = int(os.getenv("RATE_LIMIT", "60"))
+    RATE_WINDOW: float = float(os.getenv("RATE_WINDOW", "60"))
+    WS_RATE_LIMIT: int = int(os.getenv("WS_RATE_LIMIT", "10"))
+    WS_RATE_WINDOW: float = float(os.getenv("WS_RATE_WINDOW", "60"))
+    # Chat turns (messages) per window, whether sent on one session or many connections
+    WS_MESSAGE_RATE_LIMIT: int = int(os.getenv("WS_MESSAGE_RATE_LIMIT", "10"))
+    WS_MESSAGE_RATE_WINDOW: float = float(os.getenv("WS_MESSAGE_RATE_WINDOW", "60"))
+    RATE_LIMIT_ROUTES: str = os.getenv("RATE_LIMIT_ROUTES", "")
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    # Multi-turn chat sessions: idle timeout (seconds) and messages of history kept per connection
+    SESSION_IDLE_TIMEOUT: float = float(os.getenv("SESSION_IDLE_TIMEOUT", "300"))
+    SESSION_HISTORY_MESSAGES: int = int(os.getenv("SESSION_HISTORY_MESSAGES", "20"))
+    # Max nodes of a single flow run executing at the same time
+    EXECUTOR_MAX_CONCURRENCY: int = int(os.getenv("EXECUTOR_MAX_CONCURRENCY", "8"))
+    # Node outputs larger than this (estimated bytes, 0 = never) are parked on disk
+    # until the nodes that read them run; EXECUTOR_SPILL_DIR defaults to the system temp dir
+    EXECUTOR_SPILL_BYTES: int = int(os.getenv("EXECUTOR_SPILL_BYTES", "0"))
+    EXECUTOR_SPILL_DIR: str = os.getenv("EXECUTOR_SPILL_DIR", "")
+    # Default limits of one flow run (0 = unlimited): deadline in seconds, nodes
+    # executed and LLM calls made. Single nodes can set their own "timeout" in data.
+    RUN_TIMEOUT: float = float(os.getenv("RUN_TIMEOUT", "0"))
+    RUN_MAX_NODES: int = int(os.getenv("RUN_MAX_NODES", "0"))
+    RUN_MAX_LLM_CALLS: int = int(os.getenv("RUN_MAX_LLM_CALLS", "0"))
+    # Number of compiled flow plans / ready executors of stored flows kept in memory
+    PLAN_CACHE_SIZE: int = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+    EXECUTOR_CACHE_SIZE: int = int(os.getenv("EXECUTOR_CACHE_SIZE", "256"))
+    # LLM provider HTTP client: timeouts (seconds) and per-provider connection pool
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", "60"))
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "50"))
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+    # LLM admission: per-model token bucket and concurrency cap; callers queue up to
+    # LLM_QUEUE_TIMEOUT seconds. LLM_MODEL_LIMITS holds JSON per-model overrides.
+    LLM_RATE_PER_MINUTE: float = float(os.getenv("LLM_RATE_PER_MINUTE", "30"))
+    LLM_BURST: int = int(os.getenv("LLM_BURST", "5"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+    LLM_MODEL_LIMITS: str = os.getenv("LLM_MODEL_LIMITS", "")
+    # Batch runs: default and max rows in flight, and how long their LLM calls may queue
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+    BATCH_LLM_QUEUE_TIMEOUT: float = float(os.getenv("BATCH_LLM_QUEUE_TIMEOUT", "3600"))
+    # Background jobs: async workers (plus optional worker processes), max queued+running
+    # jobs, how long finished results are kept and how often expired ones are purged
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_WORKER_PROCESSES: int = int(os.getenv("JOB_WORKER_PROCESSES", "0"))
+    JOB_MAX_IN_FLIGHT: int = int(os.getenv("JOB_MAX_IN_FLIGHT", "1000"))
+    JOB_RESULT_TTL: float = float(os.getenv("JOB_RESULT_TTL", "86400"))
+    JOB_REAP_INTERVAL: float = float(os.getenv("JOB_REAP_INTERVAL", "300"))
+    # Running jobs hold a lease of JOB_LEASE_TTL seconds, renewed every JOB_HEARTBEAT_INTERVAL;
+    # the heartbeat also picks up cancel requests and requeues jobs of dead workers
+    JOB_LEASE_TTL: float = float(os.getenv("JOB_LEASE_TTL", "30"))
+    JOB_HEARTBEAT_INTERVAL: float = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "2"))
+    # LLM response cache: in-memory LRU size, SQLite file for the persistent tier
+    # (empty disables it) and the TTL used when a node opts in without its own
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+    LLM_CACHE_DB: str = os.getenv("LLM_CACHE_DB", "llm_cache.db")
+    LLM_CACHE_DEFAULT_TTL: float = float(os.getenv("LLM_CACHE_DEFAULT_TTL", "86400"))
+    # Share one provider call between identical concurrent LLM requests
+    LLM_COALESCE: bool = os.getenv("LLM_COALESCE", "True").lower() in ("1", "true", "yes")
+    # Incremental re-execution: flows with memoized node outputs, outputs kept per flow
+    MEMO_MAX_FLOWS: int = int(os.getenv("MEMO_MAX_FLOWS", "64"))
+    MEMO_MAX_ENTRIES: int = int(os.getenv("MEMO_MAX_ENTRIES", "256"))
+    # Pre-serialized flow reads: total bytes kept, and the body size above which
+    # responses are gzip/brotli-compressed for clients that accept it
+    FLOW_CACHE_MAX_BYTES: int = int(os.getenv("FLOW_CACHE_MAX_BYTES", "67108864"))
+    FLOW_COMPRESS_MIN_BYTES: int = int(os.getenv("FLOW_COMPRESS_MIN_BYTES", "4096"))
+    # Number of recent run traces kept for the run-trace API
+    TRACE_MAX_RUNS: int = int(os.getenv("TRACE_MAX_RUNS", "500"))
+    # Chat streaming: buffer tokens until this many chars or this many seconds passed
+    STREAM_MIN_CHARS: int = int(os.getenv("STREAM_MIN_CHARS", "24"))
+    STREAM_FLUSH_INTERVAL: float = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.05"))
     
     class Config:
         env_file = ".env"
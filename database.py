@@ -1,14 +1,81 @@
+from sqlalchemy import event, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from config import get_settings
+from search import create_search_index
 
-sqlite_file_name = "bisheng_lite.db"
+settings = get_settings()
+sqlite_file_name = settings.DATABASE_FILE
 sqlite_url = f"sqlite:///{sqlite_file_name}"
+async_sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
 
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer; the rest trades a little
+    # durability on power loss (synchronous=NORMAL) for far fewer fsyncs
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+pool_args = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+}
+
+# Sync engine for startup DDL and code running outside the event loop
 connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+engine = create_engine(sqlite_url, connect_args=connect_args, **pool_args)
+event.listen(engine, "connect", set_sqlite_pragmas)
+
+# Async engine used by request handlers
+async_engine = create_async_engine(async_sqlite_url, **pool_args)
+event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+def add_missing_columns():
+    # create_all doesn't alter existing tables: add columns introduced later,
+    # with the model's scalar default so existing rows get a value
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(engine.dialect)}'
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if isinstance(default, (bool, int, float)):
+                    ddl += f" DEFAULT {int(default) if isinstance(default, bool) else default}"
+                elif isinstance(default, str):
+                    ddl += " DEFAULT '" + default.replace("'", "''") + "'"
+                conn.execute(text(ddl))
 
 def create_db_and_tables():
+    add_missing_columns()
     SQLModel.metadata.create_all(engine)
+    # create_all skips tables that already exist, so add indexes introduced later
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    create_search_index(engine)
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+async def get_async_session():
+    # expire_on_commit=False: returned objects stay readable after commit without a lazy reload
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+async def dispose_engines():
+    await async_engine.dispose()
+    engine.dispose()
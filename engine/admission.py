@@ -0,0 +1,125 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from config import get_settings
+
+class AdmissionTimeout(Exception):
+    pass
+
+# Lets a caller (e.g. a batch run) wait longer in the queue than LLM_QUEUE_TIMEOUT;
+# tasks spawned by the executor inherit the value
+queue_timeout: ContextVar[Optional[float]] = ContextVar("llm_queue_timeout", default=None)
+
+class ModelAdmission:
+    # Token bucket (requests per minute, with burst) plus a max-concurrency
+    # semaphore. Waiters take tokens strictly in arrival order.
+    def __init__(self, rate_per_minute: float, burst: int, max_concurrency: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.max_concurrency = max(1, max_concurrency)
+        self._queue = asyncio.Lock()  # asyncio.Lock wakes waiters FIFO
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def _take_token(self):
+        if self.rate <= 0:
+            return  # rate limiting disabled, only concurrency applies
+        async with self._queue:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    async def _admit(self):
+        await self._take_token()
+        await self._slots.acquire()
+
+    @asynccontextmanager
+    async def acquire(self, timeout: float):
+        enqueued = time.monotonic()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._admit(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise AdmissionTimeout(f"LLM admission queue wait exceeded {timeout:g}s")
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - enqueued
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.in_flight += 1
+        try:
+            yield waited
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "rate_per_minute": round(self.rate * 60, 3),
+            "burst": self.capacity,
+            "max_concurrency": self.max_concurrency,
+            "tokens": round(self.tokens, 3),
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 3) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+class AdmissionController:
+    def __init__(self):
+        self._models: Dict[str, ModelAdmission] = {}
+
+    def _limits_for(self, model: str) -> Dict[str, Any]:
+        settings = get_settings()
+        limits = {
+            "rate_per_minute": settings.LLM_RATE_PER_MINUTE,
+            "burst": settings.LLM_BURST,
+            "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+        }
+        # LLM_MODEL_LIMITS: JSON object of per-model overrides, e.g.
+        # {"groq/llama3-70b-8192": {"rate_per_minute": 30, "max_concurrency": 4}}
+        if settings.LLM_MODEL_LIMITS:
+            limits.update(json.loads(settings.LLM_MODEL_LIMITS).get(model, {}))
+        return limits
+
+    def for_model(self, model: str) -> ModelAdmission:
+        admission = self._models.get(model)
+        if admission is None:
+            admission = ModelAdmission(**self._limits_for(model))
+            self._models[model] = admission
+        return admission
+
+    def acquire(self, model: str, timeout: Optional[float] = None):
+        if timeout is None:
+            timeout = queue_timeout.get()
+        if timeout is None:
+            timeout = get_settings().LLM_QUEUE_TIMEOUT
+        return self.for_model(model).acquire(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {model: admission.stats() for model, admission in self._models.items()}
+
+admission = AdmissionController()
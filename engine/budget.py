@@ -0,0 +1,53 @@
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from config import get_settings
+
+class RunAborted(Exception):
+    # The whole run stops: running nodes are cancelled and nothing else is scheduled
+    status = "aborted"
+    status_code = 500
+
+class RunTimeout(RunAborted):
+    status = "timeout"
+    status_code = 408
+
+class BudgetExceeded(RunAborted):
+    status = "budget_exceeded"
+    status_code = 429
+
+class RunBudget:
+    # Limits of one flow run; None (or 0 in settings) means unlimited
+    def __init__(self, timeout: Optional[float] = None, max_nodes: Optional[int] = None,
+                 max_llm_calls: Optional[int] = None):
+        self.timeout = timeout or None
+        self.max_nodes = max_nodes or None
+        self.max_llm_calls = max_llm_calls or None
+        self.nodes = 0
+        self.llm_calls = 0
+
+    @classmethod
+    def from_settings(cls) -> "RunBudget":
+        settings = get_settings()
+        return cls(settings.RUN_TIMEOUT, settings.RUN_MAX_NODES, settings.RUN_MAX_LLM_CALLS)
+
+    def charge_node(self):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise BudgetExceeded(f"Run exceeded its budget of {self.max_nodes} nodes")
+
+    def charge_llm_call(self):
+        self.llm_calls += 1
+        if self.max_llm_calls is not None and self.llm_calls > self.max_llm_calls:
+            raise BudgetExceeded(f"Run exceeded its budget of {self.max_llm_calls} LLM calls")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "timeout": self.timeout,
+            "max_nodes": self.max_nodes,
+            "max_llm_calls": self.max_llm_calls,
+            "nodes": self.nodes,
+            "llm_calls": self.llm_calls,
+        }
+
+# Budget of the run the current task belongs to; node tasks inherit it from the executor
+current_budget: ContextVar[Optional[RunBudget]] = ContextVar("run_budget", default=None)
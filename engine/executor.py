@@ -1,77 +1,247 @@
 import asyncio
-from typing import Dict, Any, List
-from .nodes import get_node_class
+import logging
+from collections import ChainMap
+from types import MappingProxyType
+from typing import AsyncIterator, Callable, Dict, Any, Optional
+from config import get_settings
+from .budget import RunAborted, RunBudget, RunTimeout, current_budget
+from .memo import node_key, node_memo
+from .plan import ExecutionPlan, get_plan
+from .spill import SpilledOutput
+from .tracing import RunTrace, trace_store
+
+logger = logging.getLogger(__name__)
 
 class GraphExecutor:
-    def __init__(self, flow_data: Dict):
+    def __init__(self, flow_data: Dict, flow_id: Optional[str] = None):
+        # Graph preprocessing lives in the compiled plan, shared across runs of the same flow
         self.flow_data = flow_data
-        self.nodes = flow_data.get("nodes", [])
-        self.edges = flow_data.get("edges", [])
-        self.node_map = {n["id"]: n for n in self.nodes}
-        # Build adjacency list: target_id -> [source_id, ...] needed?
-        # Actually we need source -> target for execution flow
-        self.adj = {n["id"]: [] for n in self.nodes}
-        for edge in self.edges:
-            self.adj[edge["source"]].append(edge["target"])
-
-    async def run(self, inputs: Dict[str, Any] = None):
-        if inputs is None:
-            inputs = {}
-            
-        # Find start node(s) - nodes with no incoming edges or specific type
-        # For simplicity, assume linear flow starts at 'InputNode' or similar
-        start_nodes = [n for n in self.nodes if n["type"] == "InputNode" or n.get("data", {}).get("type") == "input"]
-        
-        # If no explicit input node, just pick the first one (linear assumption)
-        if not start_nodes and self.nodes:
-            start_nodes = [self.nodes[0]]
-
-        results = {}
-        queue = start_nodes
-        
-        # Simple BFS/Linear execution
-        # Note: This doesn't handle complex merges/branches perfectly yet
-        visited = set()
-        
-        final_output = {}
-
-        while queue:
-            current_node_data = queue.pop(0)
-            node_id = current_node_data["id"]
-            if node_id in visited:
-                continue
-            visited.add(node_id)
-            
-            node_type = current_node_data["type"] # or data.type?
-            NodeClass = get_node_class(node_type)
-            node_instance = NodeClass(current_node_data)
-            
-            # Prepare inputs from previous results
-            # Flatten inputs from all incoming edges
-            node_inputs = inputs.copy() # Start with global inputs
-            
-            # Find incoming edges
-            incoming_edges = [e for e in self.edges if e["target"] == node_id]
-            for edge in incoming_edges:
-                source_id = edge["source"]
-                if source_id in results:
-                    # Merge outputs from source to input
-                    # In Bisheng/LangFlow, edges map sourceHandle to targetHandle
-                    # We might need to map specific keys. For now, merge dicts.
-                    node_inputs.update(results[source_id])
-
-            print(f"Executing {node_type} ({node_id}) with inputs: {node_inputs}")
+        self.flow_id = flow_id
+        self.plan: ExecutionPlan = get_plan(flow_data)
+        self.nodes = list(self.plan.nodes)
+        self.node_map = self.plan.node_map
+
+    async def _run_node(self, node_id: str, inputs: Dict[str, Any], results: Dict[str, Dict],
+                        trace: RunTrace, on_event: Optional[Callable[[Dict], None]] = None,
+                        incremental: bool = False) -> str:
+        current_node_data = self.plan.node_map[node_id]
+        node_type = current_node_data["type"]
+        node_instance = self.plan.node_classes[node_id](current_node_data)
+        node_instance.emit = on_event
+
+        # Start with global inputs, then merge outputs of every predecessor
+        # In Bisheng/LangFlow, edges map sourceHandle to targetHandle
+        # We might need to map specific keys. For now, merge dicts.
+        # A read-only layered view, not a copy: later sources win over earlier ones,
+        # every source over the global inputs
+        layers = []
+        for source_id in self.plan.incoming[node_id]:
+            output = results.get(source_id)
+            if isinstance(output, SpilledOutput):
+                output = await output.load()
+            if output is not None:
+                layers.append(output)
+        node_inputs = MappingProxyType(ChainMap(*reversed(layers), inputs))
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Executing {node_type} ({node_id}) with inputs: {node_inputs}")
+        trace.node_started(node_id)
+        if on_event:
+            on_event({"type": "node_start", "run_id": trace.run_id, "node_id": node_id, "node_type": node_type})
+        # Incremental runs reuse the output of an unchanged node (same type, data and
+        # inputs) from an earlier run of this flow, so only the dirty subgraph executes
+        memo_key = None
+        if incremental and self.flow_id and node_instance.memoize and node_instance.data.get("memoize", True):
+            memo_key = node_key(node_type, node_instance.data, node_inputs)
+        memoized = memo_key is not None and node_memo.get(self.flow_id, memo_key)
+
+        error = None
+        if memoized:
+            results[node_id] = memoized
+        else:
+            # Per-node deadline from node data ("timeout", seconds)
+            timeout = node_instance.data.get("timeout")
             try:
-                output = await node_instance.run(node_inputs)
-                results[node_id] = output
-                final_output = output # Update final output to last executed node
+                if timeout:
+                    results[node_id] = await asyncio.wait_for(node_instance.run(node_inputs), float(timeout))
+                else:
+                    results[node_id] = await node_instance.run(node_inputs)
+            except RunAborted as e:
+                trace.node_finished(node_id, None, str(e))
+                raise
+            except asyncio.TimeoutError:
+                logger.warning(f"Node {node_id} timed out after {timeout}s")
+                error = f"Node timed out after {timeout}s"
+                results[node_id] = {"error": error}
             except Exception as e:
-                print(f"Error executing {node_id}: {e}")
-                results[node_id] = {"error": str(e)}
-
-            # Add neighbors to queue
-            for neighbor_id in self.adj[node_id]:
-                if neighbor_id not in visited:
-                     queue.append(self.node_map[neighbor_id])
-        
-        return final_output
+                logger.error(f"Error executing {node_id}: {e}")
+                error = str(e)
+                results[node_id] = {"error": error}
+            if memo_key and error is None and node_instance.memoize:
+                node_memo.set(self.flow_id, memo_key, results[node_id])
+        trace.node_finished(node_id, results[node_id], error, memoized=bool(memoized))
+        if on_event:
+            on_event({
+                "type": "node_end",
+                "run_id": trace.run_id,
+                "node_id": node_id,
+                "node_type": node_type,
+                "output": results[node_id],
+                "span": trace.nodes[node_id]
+            })
+        return node_id
+
+    async def execute(self, inputs: Dict[str, Any] = None, max_concurrency: Optional[int] = None,
+                      on_event: Optional[Callable[[Dict], None]] = None,
+                      trace: Optional[RunTrace] = None, incremental: bool = False,
+                      budget: Optional[RunBudget] = None) -> Dict[str, Dict]:
+        # Dependency-counting scheduler: a node starts as soon as all of its
+        # reachable predecessors have finished, independent branches run concurrently.
+        if inputs is None:
+            inputs = {}
+        if max_concurrency is None:
+            max_concurrency = get_settings().EXECUTOR_MAX_CONCURRENCY
+        inputs = MappingProxyType(inputs)
+
+        plan = self.plan
+        pending = dict(plan.pending)
+        # Outputs are dropped (set to None) once every consumer has run, so peak memory
+        # follows the live frontier of the graph; sinks are kept for the caller.
+        # Intermediate results therefore come back as None: read node errors from the trace.
+        unread = dict(plan.consumers)
+        results: Dict[str, Any] = {}
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        settings = get_settings()
+        spill_bytes = settings.EXECUTOR_SPILL_BYTES
+
+        def release(node_id: str):
+            output = results.get(node_id)
+            if isinstance(output, SpilledOutput):
+                output.discard()
+            results[node_id] = None
+
+        # Every run is traced; pass a RunTrace in to know its run_id up front
+        if trace is None:
+            trace = RunTrace(self.flow_id, plan.flow_hash)
+        trace_store.add(trace)
+        if on_event:
+            on_event({"type": "run_start", "run_id": trace.run_id})
+
+        async def guarded(node_id: str) -> str:
+            async with semaphore:
+                return await self._run_node(node_id, inputs, results, trace, on_event, incremental)
+
+        # Run limits (deadline, max nodes, max LLM calls); node tasks see the budget
+        # through a context variable, so LLM nodes can charge their calls to it
+        if budget is None:
+            budget = RunBudget.from_settings()
+        budget_token = current_budget.set(budget)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget.timeout if budget.timeout else None
+
+        def schedule(node_id: str) -> asyncio.Task:
+            budget.charge_node()
+            trace.node_ready(node_id, plan.node_map[node_id]["type"])
+            return asyncio.create_task(guarded(node_id))
+
+        running = set()
+        status, error = "error", None
+        try:
+            # One by one, so tasks started before a budget error are still cancelled below
+            for node_id in plan.order:
+                if pending[node_id] == 0:
+                    running.add(schedule(node_id))
+            while running:
+                timeout = None if deadline is None else deadline - loop.time()
+                done = set()
+                if timeout is None or timeout > 0:
+                    done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise RunTimeout(f"Run exceeded its deadline of {budget.timeout}s")
+                for task in done:
+                    node_id = task.result()
+                    for source_id in plan.incoming[node_id]:
+                        if source_id in unread and results.get(source_id) is not None:
+                            unread[source_id] -= 1
+                            if unread[source_id] == 0:
+                                release(source_id)
+                    # Oversized outputs wait on disk for consumers that have not started yet
+                    size = trace.nodes[node_id]["output_size"] or 0
+                    if spill_bytes and unread.get(node_id, 0) > 0 and size > spill_bytes:
+                        results[node_id] = await SpilledOutput.dump(results[node_id], size, settings.EXECUTOR_SPILL_DIR)
+                        trace.nodes[node_id]["spilled"] = True
+                    for neighbor_id in plan.successors[node_id]:
+                        if neighbor_id in results or pending.get(neighbor_id, 0) <= 0:
+                            continue
+                        pending[neighbor_id] -= 1
+                        if pending[neighbor_id] == 0:
+                            running.add(schedule(neighbor_id))
+            status = "ok"
+        except asyncio.CancelledError:
+            # e.g. the client went away: every running node (and its LLM call) is cancelled
+            status = "cancelled"
+            raise
+        except RunAborted as e:
+            status, error = e.status, str(e)
+            raise
+        finally:
+            current_budget.reset(budget_token)
+            for task in running:
+                task.cancel()
+            # Let cancelled nodes unwind (release admission slots, LLM calls) before returning
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            trace.finish(status, error)
+            # Outputs still on disk belong to nodes whose consumers never ran (cycles, errors)
+            for node_id, output in list(results.items()):
+                if isinstance(output, SpilledOutput):
+                    results[node_id] = await output.load() if status == "ok" else None
+                    output.discard()
+
+        skipped = [node_id for node_id in plan.order if node_id not in results]
+        if skipped:
+            logger.warning(f"Skipped nodes waiting on a cycle: {skipped}")
+        return results
+
+    def final_node_id(self, results: Dict[str, Dict]) -> Optional[str]:
+        # The run's answer comes from the last executed sink (no executed successors),
+        # which for a linear flow is simply the last node. With a back edge every node
+        # has an executed successor; then the last executed node in plan order whose
+        # output was kept (not released) answers.
+        executed = [node_id for node_id in self.plan.order if node_id in results]
+        for node_id in reversed(executed):
+            if not any(t in results for t in self.plan.successors[node_id]):
+                return node_id
+        kept = [node_id for node_id in executed if results[node_id] is not None]
+        return kept[-1] if kept else None
+
+    async def run(self, inputs: Dict[str, Any] = None, max_concurrency: Optional[int] = None,
+                  on_event: Optional[Callable[[Dict], None]] = None, trace: Optional[RunTrace] = None,
+                  incremental: bool = False, budget: Optional[RunBudget] = None):
+        results = await self.execute(inputs, max_concurrency, on_event, trace, incremental, budget)
+        final_id = self.final_node_id(results)
+        return results[final_id] if final_id else {}
+
+    async def stream(self, inputs: Dict[str, Any] = None, max_concurrency: Optional[int] = None,
+                     incremental: bool = False, budget: Optional[RunBudget] = None) -> AsyncIterator[Dict]:
+        # Async event stream of a run: run_start, then node_start / token / node_end events,
+        # finished by a single run_end event carrying the final output and the trace
+        queue: asyncio.Queue = asyncio.Queue()
+        trace = RunTrace(self.flow_id, self.plan.flow_hash)
+        task = asyncio.create_task(
+            self.run(inputs, max_concurrency, on_event=queue.put_nowait, trace=trace,
+                     incremental=incremental, budget=budget)
+        )
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            yield {"type": "run_end", "run_id": trace.run_id, "result": task.result(), "trace": trace.to_dict()}
+        finally:
+            # Consumer stopped early (closed or cancelled): cancel the run and wait for it
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from config import get_settings
+from database import async_engine
+from models import Flow
+from .executor import GraphExecutor
+
+class ExecutorCache:
+    # Ready-to-run executors keyed by (flow_id, update_time), LRU bounded.
+    # A newer update_time simply misses; invalidate() drops a flow eagerly.
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, Optional[str]], GraphExecutor]" = OrderedDict()
+        self._keys: Dict[str, Tuple[str, Optional[str]]] = {}
+
+    def get(self, flow_id: str, update_time: Optional[str]) -> Optional[GraphExecutor]:
+        key = (flow_id, update_time)
+        executor = self._entries.get(key)
+        if executor is not None:
+            self._entries.move_to_end(key)
+        return executor
+
+    def put(self, flow_id: str, update_time: Optional[str], executor: GraphExecutor):
+        self.invalidate(flow_id)
+        key = (flow_id, update_time)
+        self._entries[key] = executor
+        self._keys[flow_id] = key
+        while len(self._entries) > self.max_size:
+            (old_id, _), _ = self._entries.popitem(last=False)
+            self._keys.pop(old_id, None)
+
+    def invalidate(self, flow_id: str):
+        key = self._keys.pop(flow_id, None)
+        if key is not None:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+executor_cache = ExecutorCache(get_settings().EXECUTOR_CACHE_SIZE)
+
+async def load_executor(flow_id: str) -> Optional[GraphExecutor]:
+    # Short-lived session: only the cheap update_time lookup on a warm hit,
+    # the data graph is read and compiled only on a miss
+    async with AsyncSession(async_engine) as session:
+        row = (await session.exec(select(Flow.id, Flow.update_time).where(Flow.id == flow_id))).first()
+        if row is None:
+            return None
+        executor = executor_cache.get(flow_id, row.update_time)
+        if executor is not None:
+            return executor
+        flow_data = (await session.exec(select(Flow.data).where(Flow.id == flow_id))).first()
+
+    executor = GraphExecutor(flow_data or {}, flow_id=flow_id)
+    executor_cache.put(flow_id, row.update_time, executor)
+    return executor
@@ -0,0 +1,345 @@
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+from sqlmodel import select, delete, update, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
+from config import get_settings
+from database import async_engine
+from models import Flow, Job
+from .executor import GraphExecutor
+from .executor_cache import load_executor
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+# How often a process worker checks whether its job was cancelled (seconds)
+_CANCEL_POLL_INTERVAL = 0.1
+
+class QueueFull(Exception):
+    pass
+
+class JobCancelled(Exception):
+    pass
+
+async def _run_cancellable(flow_data: Dict, inputs: Dict[str, Any], cancel_event) -> Dict:
+    # The parent sets cancel_event to cancel the job; the run is polled for it
+    task = asyncio.create_task(GraphExecutor(flow_data).run(inputs))
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=_CANCEL_POLL_INTERVAL)
+        if done:
+            return task.result()
+        if cancel_event.is_set():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            raise JobCancelled("Cancelled while running")
+
+def _run_in_process(flow_data: Dict, inputs: Dict[str, Any], cancel_event) -> Dict:
+    # Entry point of process workers: a fresh executor on the worker's own event loop
+    return asyncio.run(_run_cancellable(flow_data, inputs, cancel_event))
+
+class JobManager:
+    # Persistent background runs of stored flows. Jobs live in the `job` table so
+    # queued and interrupted ones are picked up again after a restart; a pool of
+    # async workers takes them by priority. Several processes may share the table:
+    # a job is claimed with a lease, and only jobs whose lease expired are recovered.
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._workers = []
+        self._reaper: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._in_flight = 0
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        # Process mode: cancelling the awaiting task does not stop the child, so every
+        # running job also gets an event (shared through a manager) the child checks
+        self._manager = None
+        self._process_cancel: Dict[str, Any] = {}
+
+    async def start(self):
+        settings = get_settings()
+        self._queue = asyncio.PriorityQueue()
+        if settings.JOB_WORKER_PROCESSES > 0:
+            self._process_pool = ProcessPoolExecutor(max_workers=settings.JOB_WORKER_PROCESSES)
+            self._manager = Manager()
+
+        # Queued jobs are enqueued here too; claiming is a compare-and-set, so a job
+        # another process already took is simply skipped by our workers
+        async with AsyncSession(async_engine) as session:
+            jobs = (await session.exec(
+                select(Job.id, Job.priority).where(Job.status == "queued")
+                .order_by(Job.priority.desc(), Job.create_time)
+            )).all()
+        for job_id, priority in jobs:
+            self._enqueue(job_id, priority)
+        recovered = await self._recover_expired()
+        if jobs or recovered:
+            logger.info(f"Recovered {len(jobs)} queued and {recovered} interrupted jobs")
+
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(settings.JOB_WORKERS)]
+        self._reaper = asyncio.create_task(self._reap_expired())
+        self._heartbeat = asyncio.create_task(self._renew_leases())
+
+    async def stop(self):
+        tasks = self._workers + [task for task in (self._reaper, self._heartbeat) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._reaper = None
+        self._heartbeat = None
+        if self._process_pool is not None:
+            for event in self._process_cancel.values():
+                event.set()
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def _enqueue(self, job_id: str, priority: int):
+        self._in_flight += 1
+        self._queue.put_nowait((-priority, next(self._seq), job_id))
+
+    async def submit(self, flow_id: str, inputs: Dict[str, Any], priority: int = 0) -> Job:
+        if self._in_flight >= get_settings().JOB_MAX_IN_FLIGHT:
+            raise QueueFull("Too many jobs in flight, try again later")
+        job = Job(
+            id=str(uuid.uuid4()),
+            flow_id=flow_id,
+            priority=priority,
+            inputs=inputs,
+            create_time=datetime.now().isoformat()
+        )
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            session.add(job)
+            await session.commit()
+        self._enqueue(job.id, priority)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        async with AsyncSession(async_engine) as session:
+            job = await session.get(Job, job_id)
+        if job is not None and job.expires_at is not None and job.expires_at <= time.time():
+            return None
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        job = await self.get(job_id)
+        if job is None or job.status in TERMINAL_STATUSES:
+            return job
+        # Still queued: only wins if a worker has not claimed it in the meantime
+        if await self._transition(job_id, "queued", **self._finished_fields("cancelled", error="Cancelled before start")):
+            return await self.get(job_id)
+        # Running, possibly in another process: the flag is persisted and the owner's
+        # heartbeat acts on it; a job running here is cancelled right away
+        async with AsyncSession(async_engine) as session:
+            await session.exec(
+                update(Job).where(Job.id == job_id, Job.status == "running").values(cancel_requested=True)
+            )
+            await session.commit()
+        self._cancel_local(job_id)
+        return await self.get(job_id)
+
+    def _cancel_local(self, job_id: str):
+        task = self._running.get(job_id)
+        if task is None:
+            return
+        event = self._process_cancel.get(job_id)
+        if event is not None:
+            event.set()  # stops the run inside the worker process
+        task.cancel()  # the worker records the cancellation
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def _publish(self, job: Job):
+        for queue in self._subscribers.get(job.id, ()):
+            queue.put_nowait(job)
+
+    async def _transition(self, job_id: str, from_status: str, **fields) -> bool:
+        # Compare-and-set on status, so a worker claiming a job and a cancel can't both win
+        async with AsyncSession(async_engine) as session:
+            outcome = await session.exec(
+                update(Job).where(Job.id == job_id, Job.status == from_status).values(**fields)
+            )
+            await session.commit()
+        if outcome.rowcount != 1:
+            return False
+        job = await self.get(job_id)
+        if job is not None:
+            self._publish(job)
+        return True
+
+    def _finished_fields(self, status: str, result: Optional[Dict] = None, error: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "status": status,
+            "result": result,
+            "error": error,
+            "finish_time": datetime.now().isoformat(),
+            "expires_at": time.time() + get_settings().JOB_RESULT_TTL,
+        }
+
+    async def _finish(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None) -> bool:
+        # Only the lease owner records the outcome; if our lease expired and the job was
+        # requeued, the outcome of this run is dropped
+        fields = self._finished_fields(status, result, error)
+        fields.update(owner=None, lease_until=None)
+        async with AsyncSession(async_engine) as session:
+            outcome = await session.exec(
+                update(Job).where(Job.id == job_id, Job.owner == self.worker_id, Job.status == "running").values(**fields)
+            )
+            await session.commit()
+        if outcome.rowcount != 1:
+            logger.warning(f"Job {job_id} is no longer leased by this worker, dropping its outcome")
+            return False
+        job = await self.get(job_id)
+        if job is not None:
+            self._publish(job)
+        return True
+
+    async def _execute(self, job: Job) -> Dict:
+        if self._process_pool is not None:
+            async with AsyncSession(async_engine) as session:
+                flow_data = (await session.exec(select(Flow.data).where(Flow.id == job.flow_id))).first()
+            if flow_data is None:
+                raise LookupError("Flow not found")
+            loop = asyncio.get_running_loop()
+            cancel_event = self._manager.Event()
+            self._process_cancel[job.id] = cancel_event
+            try:
+                return await loop.run_in_executor(
+                    self._process_pool, _run_in_process, flow_data, job.inputs or {}, cancel_event
+                )
+            except asyncio.CancelledError:
+                cancel_event.set()
+                raise
+            finally:
+                self._process_cancel.pop(job.id, None)
+
+        executor = await load_executor(job.flow_id)
+        if executor is None:
+            raise LookupError("Flow not found")
+        return await executor.run(job.inputs or {})
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                claimed = await self._transition(
+                    job_id, "queued", status="running", start_time=datetime.now().isoformat(),
+                    owner=self.worker_id, lease_until=time.time() + get_settings().JOB_LEASE_TTL
+                )
+                if not claimed:
+                    continue  # cancelled, expired or already taken
+                job = await self.get(job_id)
+                task = asyncio.create_task(self._execute(job))
+                self._running[job_id] = task
+                if job.cancel_requested:
+                    task.cancel()
+                try:
+                    result = await task
+                    await self._finish(job_id, "succeeded", result=result)
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        # The worker itself is shutting down; the job is recovered once its lease expires
+                        task.cancel()
+                        raise
+                    await self._finish(job_id, "cancelled", error="Cancelled while running")
+                except Exception as e:
+                    logger.error(f"Job {job_id} failed: {e}")
+                    await self._finish(job_id, "failed", error=str(e))
+                finally:
+                    self._running.pop(job_id, None)
+            finally:
+                self._in_flight -= 1
+                self._queue.task_done()
+
+    async def _reap_expired(self):
+        # Finished jobs keep their results for JOB_RESULT_TTL seconds
+        while True:
+            await asyncio.sleep(get_settings().JOB_REAP_INTERVAL)
+            try:
+                async with AsyncSession(async_engine) as session:
+                    await session.exec(delete(Job).where(Job.expires_at <= time.time()))
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Job cleanup failed: {e}")
+
+    async def _recover_expired(self) -> int:
+        # Running jobs whose owner stopped renewing the lease (crashed or stopped worker)
+        # go back to the queue; compare-and-set on lease_until so only one worker requeues
+        now = time.time()
+        async with AsyncSession(async_engine) as session:
+            rows = (await session.exec(
+                select(Job.id, Job.priority, Job.lease_until).where(
+                    Job.status == "running", or_(Job.lease_until.is_(None), Job.lease_until < now)
+                )
+            )).all()
+            recovered = []
+            for job_id, priority, lease_until in rows:
+                lease = Job.lease_until.is_(None) if lease_until is None else Job.lease_until == lease_until
+                outcome = await session.exec(
+                    update(Job).where(Job.id == job_id, Job.status == "running", lease)
+                    .values(status="queued", owner=None, lease_until=None, start_time=None)
+                )
+                if outcome.rowcount == 1:
+                    recovered.append((job_id, priority))
+            await session.commit()
+        for job_id, priority in recovered:
+            self._enqueue(job_id, priority)
+        return len(recovered)
+
+    async def _renew_leases(self):
+        # Heartbeat: extend the leases of jobs running here, act on cancel requests
+        # made through any worker, and take over jobs of workers that went away
+        while True:
+            settings = get_settings()
+            await asyncio.sleep(settings.JOB_HEARTBEAT_INTERVAL)
+            try:
+                running = list(self._running)
+                if running:
+                    async with AsyncSession(async_engine) as session:
+                        await session.exec(
+                            update(Job).where(Job.id.in_(running), Job.owner == self.worker_id, Job.status == "running")
+                            .values(lease_until=time.time() + settings.JOB_LEASE_TTL)
+                        )
+                        cancelled = (await session.exec(
+                            select(Job.id).where(Job.id.in_(running), Job.cancel_requested == True)  # noqa: E712
+                        )).all()
+                        await session.commit()
+                    for job_id in cancelled:
+                        self._cancel_local(job_id)
+                await self._recover_expired()
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._workers),
+            "process_workers": get_settings().JOB_WORKER_PROCESSES if self._process_pool else 0,
+            "in_flight": self._in_flight,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": len(self._running),
+        }
+
+job_manager = JobManager()
@@ -0,0 +1,64 @@
+from typing import TYPE_CHECKING, Any, Dict, List
+import httpx
+from config import get_settings
+
+# litellm is by far the heaviest import in the stack; it is only imported once a
+# worker actually makes an LLM call
+if TYPE_CHECKING:
+    from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+
+# One keep-alive connection pool per provider, shared by every LLM node in the worker
+_clients: Dict[str, "AsyncHTTPHandler"] = {}
+
+def provider_of(model: str) -> str:
+    return model.split("/", 1)[0] if "/" in model else "openai"
+
+def get_client(provider: str) -> "AsyncHTTPHandler":
+    client = _clients.get(provider)
+    if client is None:
+        from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+        settings = get_settings()
+        timeout = httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+        limits = httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        )
+        client = AsyncHTTPHandler(timeout=timeout)
+        client.client = httpx.AsyncClient(timeout=timeout, limits=limits)
+        _clients[provider] = client
+    return client
+
+def api_key_for(provider: str) -> str:
+    settings = get_settings()
+    if provider == "groq":
+        return settings.GROQ_API_KEY
+    return ""
+
+async def acomplete(model: str, messages: List[Dict[str, Any]], **params):
+    # Non-blocking completion over the provider's pooled client
+    from litellm import acompletion
+    provider = provider_of(model)
+    return await acompletion(
+        model=model,
+        messages=messages,
+        api_key=api_key_for(provider) or None,
+        client=get_client(provider),
+        timeout=get_settings().LLM_TIMEOUT,
+        **params
+    )
+
+async def astream(model: str, messages: List[Dict[str, Any]], **params):
+    # Yield text deltas as the provider produces them
+    response = await acomplete(model, messages, stream=True, **params)
+    async for chunk in response:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+async def close_clients():
+    for client in _clients.values():
+        await client.client.aclose()
+    _clients.clear()
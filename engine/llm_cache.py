@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from config import get_settings
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    # Whitespace/line-ending noise around a prompt must not split cache entries
+    normalized = []
+    for message in messages:
+        content = str(message.get("content", "")).replace("\r\n", "\n").strip()
+        normalized.append({"role": str(message.get("role", "user")).lower(), "content": content})
+    return normalized
+
+def make_key(model: str, messages: List[Dict[str, Any]], params: Optional[Dict[str, Any]] = None) -> str:
+    payload = {"model": model, "messages": normalize_messages(messages), "params": params or {}}
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+class LLMResponseCache:
+    # Exact-match completion cache: bounded in-memory LRU in front of a
+    # SQLite table, both honouring a per-entry expiry time.
+    def __init__(self, max_entries: int, db_path: Optional[str]):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple]:
+        with self._lock:
+            row = self._db().execute("SELECT expires_at, value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and row[0] <= now:
+                self._db().execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db().commit()
+                return None
+            return row
+
+    def _disk_set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+            self._writes += 1
+            # Purge expired rows now and then so the table doesn't grow forever
+            if self._writes % 500 == 0:
+                db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+            db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: str):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        if self.db_path:
+            row = await asyncio.to_thread(self._disk_get, key, now)
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                self.disk_hits += 1
+                return row[1]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl: float):
+        expires_at = time.time() + ttl
+        self._remember(key, expires_at, value)
+        self.stores += 1
+        if self.db_path:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "memory_entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+_settings = get_settings()
+llm_cache = LLMResponseCache(_settings.LLM_CACHE_MAX_ENTRIES, _settings.LLM_CACHE_DB or None)
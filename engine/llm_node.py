@@ -0,0 +1,97 @@
+from typing import Any, Dict
+import time
+import metrics
+from config import get_settings
+from .admission import AdmissionTimeout, admission
+from .budget import current_budget
+from .llm import acomplete, astream
+from .llm_cache import llm_cache, make_key
+from .nodes import BaseNode
+from .singleflight import llm_flights
+
+# Node data keys forwarded to the provider (and part of the cache key)
+GENERATION_PARAMS = ("temperature", "max_tokens", "top_p")
+
+class LLMNode(BaseNode):
+    @classmethod
+    def validate_config(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+        # Use Groq via LiteLLM
+        # Model name for Groq. User requested Groq.
+        # Default to llama3-8b-8192
+        model = data.get("model_name") or "groq/llama3-8b-8192"
+        if not model.startswith("groq/"):
+            # If UI sends just "llama3...", prepend provider if needed, or assume data has full name
+            # For this specific task, forced Groq
+            model = "groq/llama3-8b-8192"
+        data["model_name"] = model
+        return data
+
+    def generation_params(self) -> Dict[str, Any]:
+        return {k: self.data[k] for k in GENERATION_PARAMS if self.data.get(k) is not None}
+
+    async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # Fallback logic for prompt input
+        prompt = inputs.get("prompt") or inputs.get("result") or inputs.get("input_value") or ""
+        
+        if not prompt:
+            return {"result": "Error: No prompt provided to LLM Node"}
+
+        model = self.data["model_name"]
+        # Earlier turns of a multi-turn chat session come in as `history`
+        history = [{"role": m["role"], "content": str(m["content"])} for m in inputs.get("history") or []]
+        messages = history + [{"role": "user", "content": str(prompt)}]
+        params = self.generation_params()
+
+        # Opt-in exact-match cache (node data: cache / cache_ttl); hits skip the provider and admission
+        cache_key = make_key(model, messages, params) if self.data.get("cache") else None
+        if cache_key:
+            cached = await llm_cache.get(cache_key)
+            if cached is not None:
+                self.emit_token(cached)
+                return {"result": cached}
+
+        # Cache hits are free; anything that may reach the provider counts against the run budget
+        budget = current_budget.get()
+        if budget is not None:
+            budget.charge_llm_call()
+
+        async def upstream():
+            # Wait for the model's admission queue instead of failing; an AdmissionTimeout
+            # propagates so the executor records a real error rather than a fake answer
+            async with admission.acquire(model):
+                start = time.perf_counter()
+                try:
+                    if self.emit is not None:
+                        # Someone is listening: forward tokens as they arrive
+                        async for chunk in astream(model=model, messages=messages, **params):
+                            yield chunk
+                    else:
+                        response = await acomplete(model=model, messages=messages, **params)
+                        yield response.choices[0].message.content or ""
+                except Exception:
+                    metrics.LLM_LATENCY.observe(time.perf_counter() - start, model, "error")
+                    metrics.LLM_ERRORS.inc(model)
+                    raise
+                metrics.LLM_LATENCY.observe(time.perf_counter() - start, model, "ok")
+
+        try:
+            if get_settings().LLM_COALESCE and self.data.get("coalesce", True):
+                # Identical calls already in flight share one upstream request (node data: coalesce)
+                key = cache_key or make_key(model, messages, params)
+                answer = await llm_flights.run(key, upstream, on_chunk=self.emit_token)
+            else:
+                parts = []
+                async for chunk in upstream():
+                    parts.append(chunk)
+                    self.emit_token(chunk)
+                answer = "".join(parts)
+        except AdmissionTimeout:
+            raise
+        except Exception as e:
+            self.memoize = False
+            return {"result": f"LLM Error: {str(e)}"}
+
+        if cache_key and answer:
+            ttl = float(self.data.get("cache_ttl") or get_settings().LLM_CACHE_DEFAULT_TTL)
+            await llm_cache.set(cache_key, answer, ttl)
+        return {"result": answer}
@@ -0,0 +1,60 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional
+from config import get_settings
+
+def node_key(node_type: str, data: Mapping[str, Any], inputs: Mapping[str, Any]) -> str:
+    # Same node type, config and resolved inputs -> same output, wherever the node sits
+    # Node data and inputs arrive as read-only mapping views, which json can't encode
+    raw = json.dumps([node_type, dict(data), dict(inputs)], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class NodeMemo:
+    # Node outputs of earlier runs, per flow, for incremental re-execution.
+    # Both the number of flows and the entries per flow are LRU-bounded.
+    def __init__(self, max_flows: int, max_entries: int):
+        self.max_flows = max_flows
+        self.max_entries = max_entries
+        self._flows: "OrderedDict[str, OrderedDict[str, Dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, flow_id: str, key: str) -> Optional[Dict]:
+        entries = self._flows.get(flow_id)
+        result = entries.get(key) if entries is not None else None
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._flows.move_to_end(flow_id)
+        entries.move_to_end(key)
+        return result
+
+    def set(self, flow_id: str, key: str, result: Dict):
+        entries = self._flows.get(flow_id)
+        if entries is None:
+            entries = self._flows[flow_id] = OrderedDict()
+            while len(self._flows) > self.max_flows:
+                self._flows.popitem(last=False)
+        self._flows.move_to_end(flow_id)
+        entries[key] = result
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def drop(self, flow_id: str):
+        self._flows.pop(flow_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "flows": len(self._flows),
+            "entries": sum(len(entries) for entries in self._flows.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+_settings = get_settings()
+node_memo = NodeMemo(_settings.MEMO_MAX_FLOWS, _settings.MEMO_MAX_ENTRIES)
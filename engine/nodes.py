@@ -1,16 +1,32 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Type, Union
+import importlib
 import os
 
 class BaseNode:
+    # Whether incremental runs may reuse this node's output for the same data and
+    # inputs; non-deterministic nodes set it False (a run may also clear it on failure)
+    memoize = True
+
     def __init__(self, node_data: Dict):
         self.id = node_data.get("id")
         self.type = node_data.get("type", "custom")
         self.data = node_data.get("data", {})
         self.inputs = {}
+        # Set by the executor when someone is consuming the run's event stream
+        self.emit: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    @classmethod
+    def validate_config(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+        # Called once when a flow is compiled; normalize or reject node `data` here
+        return data
     
     async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         return {}
 
+    def emit_token(self, chunk: str):
+        if self.emit is not None:
+            self.emit({"type": "token", "node_id": self.id, "chunk": chunk})
+
 class InputNode(BaseNode):
     async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         # Input node usually gets data from global inputs or previous connection
@@ -19,60 +35,53 @@ class InputNode(BaseNode):
              return {"result": inputs["input_value"]}
         return {"result": self.data.get("input_value", "")}
 
-from config import get_settings
-from litellm import completion
-import os
-import time
-
-# Global naive limit for LLM calls (per process for MVP)
-LAST_ALARM_TIME = 0
-MIN_INTERVAL = 3.0 # seconds between calls globally
-
-class LLMNode(BaseNode):
-    async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
-        global LAST_ALARM_TIME
-        now = time.time()
-        if now - LAST_ALARM_TIME < MIN_INTERVAL:
-             return {"result": "Rate limit exceeded for LLM Node (Global MVP Limit)"}
-        LAST_ALARM_TIME = now
-        
-        settings = get_settings()
-        # Fallback logic for prompt input
-        prompt = inputs.get("prompt") or inputs.get("result") or inputs.get("input_value") or ""
-        
-        if not prompt:
-            return {"result": "Error: No prompt provided to LLM Node"}
-
-        try:
-            # Use Groq via LiteLLM
-            # Model name for Groq. User requested Groq.
-            # Default to llama3-8b-8192
-            model = self.data.get("model_name", "groq/llama3-8b-8192")
-            if not model.startswith("groq/"):
-                # If UI sends just "llama3...", prepend provider if needed, or assume data has full name
-                # For this specific task, forced Groq
-                model = "groq/llama3-8b-8192"
-
-            response = completion(
-                model=model,
-                messages=[{"role": "user", "content": str(prompt)}],
-                api_key=settings.GROQ_API_KEY
-            )
-            
-            answer = response.choices[0].message.content
-            return {"result": answer}
-        except Exception as e:
-            return {"result": f"LLM Error: {str(e)}"}
-
 class OutputNode(BaseNode):
     async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         return {"result": inputs.get("text", "")}
 
-NODE_REGISTRY = {
-    "InputNode": InputNode,
-    "LLMNode": LLMNode,
-    "OutputNode": OutputNode
+# Node types are declared as "module:attribute" and imported on first use, so a
+# worker only pays for the node implementations its flows actually run (LLMNode
+# pulls in the LLM client stack). Installed packages can add node types through
+# the "bisheng_lite.nodes" entry point group.
+NODE_REGISTRY: Dict[str, Union[str, Type[BaseNode]]] = {
+    "InputNode": "engine.nodes:InputNode",
+    "LLMNode": "engine.llm_node:LLMNode",
+    "OutputNode": "engine.nodes:OutputNode"
 }
+ENTRY_POINT_GROUP = "bisheng_lite.nodes"
+
+_loaded: Dict[str, Type[BaseNode]] = {}
+_entry_points_scanned = False
+
+def register_node(node_type: str, target: Union[str, Type[BaseNode]]):
+    NODE_REGISTRY[node_type] = target
+    _loaded.pop(node_type, None)
+
+def _scan_entry_points():
+    # Reads package metadata only; plugin modules are imported when first used
+    global _entry_points_scanned
+    _entry_points_scanned = True
+    from importlib.metadata import entry_points
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        NODE_REGISTRY.setdefault(entry_point.name, entry_point.value)
+
+def get_node_class(node_type: str) -> Type[BaseNode]:
+    node_class = _loaded.get(node_type)
+    if node_class is not None:
+        return node_class
+    if node_type not in NODE_REGISTRY and not _entry_points_scanned:
+        _scan_entry_points()
+    target = NODE_REGISTRY.get(node_type)
+    if target is None:
+        return BaseNode
+    if isinstance(target, str):
+        module_name, _, attribute = target.partition(":")
+        try:
+            target = getattr(importlib.import_module(module_name), attribute)
+        except (ImportError, AttributeError) as e:
+            raise ValueError(f"Node type {node_type} could not be loaded from {module_name}:{attribute}: {e}")
+    _loaded[node_type] = target
+    return target
 
-def get_node_class(node_type: str):
-    return NODE_REGISTRY.get(node_type, BaseNode)
+def loaded_node_types() -> List[str]:
+    return sorted(_loaded)
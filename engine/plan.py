@@ -0,0 +1,130 @@
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple, Type
+from config import get_settings
+from .nodes import BaseNode, get_node_class
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    # Everything a run needs that only depends on the graph itself,
+    # computed once per distinct flow and shared by every run of it.
+    flow_hash: str
+    nodes: Tuple[Mapping[str, Any], ...]             # declaration order, validated node dicts
+    node_map: Mapping[str, Mapping[str, Any]]
+    node_classes: Mapping[str, Type[BaseNode]]
+    successors: Mapping[str, Tuple[str, ...]]         # source -> distinct targets
+    incoming: Mapping[str, Tuple[str, ...]]           # target -> sources, in edge order
+    start_ids: Tuple[str, ...]
+    order: Tuple[str, ...]                            # reachable nodes, topological order
+    pending: Mapping[str, int]                        # reachable predecessors to wait for
+    consumers: Mapping[str, int]                      # successors that will read the node's output
+
+def flow_hash(flow_data: Dict) -> str:
+    # Only nodes and edges shape the plan; key order must not change the hash
+    graph = {"nodes": flow_data.get("nodes", []), "edges": flow_data.get("edges", [])}
+    encoded = json.dumps(graph, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+def compile_flow(flow_data: Dict, key: Optional[str] = None) -> ExecutionPlan:
+    raw_nodes = flow_data.get("nodes", []) or []
+    raw_edges = flow_data.get("edges", []) or []
+
+    nodes = []
+    node_classes = {}
+    for raw in raw_nodes:
+        if "id" not in raw or "type" not in raw:
+            raise ValueError(f"Flow node is missing 'id' or 'type': {raw}")
+        if raw["id"] in node_classes:
+            raise ValueError(f"Duplicate node id: {raw['id']}")
+        NodeClass = get_node_class(raw["type"])
+        node = dict(raw)
+        node["data"] = MappingProxyType(NodeClass.validate_config(dict(raw.get("data") or {})))
+        nodes.append(MappingProxyType(node))
+        node_classes[raw["id"]] = NodeClass
+
+    successors = {n["id"]: [] for n in nodes}
+    incoming = {n["id"]: [] for n in nodes}
+    for edge in raw_edges:
+        source, target = edge.get("source"), edge.get("target")
+        if source not in successors or target not in successors:
+            raise ValueError(f"Edge references unknown node: {source} -> {target}")
+        if target not in successors[source]:
+            successors[source].append(target)
+        if source not in incoming[target]:
+            incoming[target].append(source)
+
+    # Start node(s): explicit input nodes, else the first node (linear assumption)
+    start_ids = [n["id"] for n in nodes if n["type"] == "InputNode" or n["data"].get("type") == "input"]
+    if not start_ids and nodes:
+        start_ids = [nodes[0]["id"]]
+
+    # Only nodes reachable from the start nodes take part in a run
+    seen = set(start_ids)
+    stack = list(start_ids)
+    while stack:
+        for neighbor_id in successors[stack.pop()]:
+            if neighbor_id not in seen:
+                seen.add(neighbor_id)
+                stack.append(neighbor_id)
+    reachable = [n["id"] for n in nodes if n["id"] in seen]
+
+    pending = {}
+    for node_id in reachable:
+        # Explicit start nodes never wait, even if something points back at them
+        pending[node_id] = 0 if node_id in start_ids else sum(1 for s in incoming[node_id] if s in seen)
+
+    # Kahn's algorithm over the reachable subgraph, declaration order breaks ties
+    remaining = dict(pending)
+    order = []
+    ready = [node_id for node_id in reachable if remaining[node_id] == 0]
+    while ready:
+        node_id = ready.pop(0)
+        order.append(node_id)
+        for neighbor_id in successors[node_id]:
+            if neighbor_id in remaining and remaining[neighbor_id] > 0:
+                remaining[neighbor_id] -= 1
+                if remaining[neighbor_id] == 0:
+                    ready.append(neighbor_id)
+    # Anything left sits on a cycle and will never become ready
+    order.extend(node_id for node_id in reachable if node_id not in order)
+
+    # Start nodes run first and so never read their predecessors
+    consumers = {
+        node_id: sum(1 for t in successors[node_id] if t in seen and t not in start_ids)
+        for node_id in reachable
+    }
+
+    return ExecutionPlan(
+        flow_hash=key or flow_hash(flow_data),
+        nodes=tuple(nodes),
+        node_map=MappingProxyType({n["id"]: n for n in nodes}),
+        node_classes=MappingProxyType(node_classes),
+        successors=MappingProxyType({k: tuple(v) for k, v in successors.items()}),
+        incoming=MappingProxyType({k: tuple(v) for k, v in incoming.items()}),
+        start_ids=tuple(start_ids),
+        order=tuple(order),
+        pending=MappingProxyType(pending),
+        consumers=MappingProxyType(consumers),
+    )
+
+# LRU of compiled plans keyed by flow hash
+_plan_cache: "OrderedDict[str, ExecutionPlan]" = OrderedDict()
+
+def get_plan(flow_data: Dict) -> ExecutionPlan:
+    key = flow_hash(flow_data)
+    plan = _plan_cache.get(key)
+    if plan is not None:
+        _plan_cache.move_to_end(key)
+        return plan
+
+    plan = compile_flow(flow_data, key)
+    _plan_cache[key] = plan
+    while len(_plan_cache) > get_settings().PLAN_CACHE_SIZE:
+        _plan_cache.popitem(last=False)
+    return plan
+
+def clear_plan_cache():
+    _plan_cache.clear()
@@ -0,0 +1,96 @@
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+class FlightCancelled(Exception):
+    pass
+
+class _Flight:
+    # One upstream call and the chunks it produced so far. Chunks are kept
+    # until the call finishes so late joiners can replay the stream from the start.
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self, on_chunk: Optional[Callable[[str], None]]) -> str:
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                if on_chunk is not None:
+                    on_chunk(self.chunks[index])
+                index += 1
+            if self.done:
+                break
+            await self._changed.wait()
+        if self.error is not None:
+            raise self.error
+        return "".join(self.chunks)
+
+class SingleFlight:
+    # Coalesces identical in-flight calls: the first caller for a key starts the
+    # upstream call as a task of its own, later callers with the same key attach
+    # to it and receive the same chunks and result. The upstream call is
+    # cancelled only once every waiter has gone away.
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def _lead(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[str]]):
+        try:
+            async for chunk in factory():
+                flight.chunks.append(chunk)
+                flight._notify()
+        except asyncio.CancelledError:
+            flight.error = FlightCancelled("Upstream call cancelled")
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight._notify()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def run(self, key: str, factory: Callable[[], AsyncIterator[str]],
+                  on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        # `factory` is only called when no identical call is in flight; it yields
+        # the answer in chunks. Upstream errors are re-raised in every waiter.
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._lead(key, flight, factory))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await flight.follow(on_chunk)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.done:
+                # Last interested caller left (e.g. its client disconnected)
+                self.abandoned += 1
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "waiters": sum(flight.waiters for flight in self._flights.values()),
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
+
+llm_flights = SingleFlight()
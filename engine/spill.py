@@ -0,0 +1,33 @@
+import asyncio
+import os
+import pickle
+import tempfile
+from typing import Any, Optional
+
+class SpilledOutput:
+    # Stand-in for a node output parked on disk until its consumers run.
+    # Pickle is fine here: the executor only ever reads back files it wrote itself.
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+
+    @classmethod
+    async def dump(cls, output: Any, size: int, directory: Optional[str] = None) -> "SpilledOutput":
+        def write() -> str:
+            fd, path = tempfile.mkstemp(prefix="bisheng-spill-", suffix=".pkl", dir=directory or None)
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+            return path
+        return cls(await asyncio.to_thread(write), size)
+
+    async def load(self) -> Any:
+        def read() -> Any:
+            with open(self.path, "rb") as f:
+                return pickle.load(f)
+        return await asyncio.to_thread(read)
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,113 @@
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from config import get_settings
+
+def estimate_size(value: Any) -> int:
+    # Rough payload size in bytes/chars without serializing the whole thing
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(k)) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+    return 8
+
+class RunTrace:
+    # Spans of one flow run. Node timings are ms offsets from the run start:
+    # input_wait = run start -> all inputs ready, queue_wait = ready -> started
+    # (concurrency cap), run = started -> finished.
+    def __init__(self, flow_id: Optional[str] = None, flow_hash: Optional[str] = None):
+        self.run_id = uuid.uuid4().hex
+        self.flow_id = flow_id
+        self.flow_hash = flow_hash
+        self.start_time = datetime.now().isoformat()
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.duration_ms: Optional[float] = None
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self._t0 = time.perf_counter()
+
+    def _offset(self) -> float:
+        return round((time.perf_counter() - self._t0) * 1000, 3)
+
+    def node_ready(self, node_id: str, node_type: str):
+        self.nodes[node_id] = {
+            "node_id": node_id,
+            "node_type": node_type,
+            "ready_ms": self._offset(),
+            "start_ms": None,
+            "end_ms": None,
+            "input_wait_ms": None,
+            "queue_wait_ms": None,
+            "run_ms": None,
+            "output_size": None,
+            "error": None,
+            "memoized": False,
+            "spilled": False,
+        }
+        self.nodes[node_id]["input_wait_ms"] = self.nodes[node_id]["ready_ms"]
+
+    def node_started(self, node_id: str):
+        span = self.nodes[node_id]
+        span["start_ms"] = self._offset()
+        span["queue_wait_ms"] = round(span["start_ms"] - span["ready_ms"], 3)
+
+    def node_finished(self, node_id: str, output: Any, error: Optional[str] = None, memoized: bool = False):
+        span = self.nodes[node_id]
+        span["end_ms"] = self._offset()
+        span["run_ms"] = round(span["end_ms"] - span["start_ms"], 3)
+        span["output_size"] = estimate_size(output)
+        # Nodes may also report a failure as an {"error": ...} output instead of raising
+        if error is None and isinstance(output, dict) and "error" in output:
+            error = str(output["error"])
+        span["error"] = error
+        span["memoized"] = memoized
+
+    def errors(self) -> Dict[str, str]:
+        # Failed nodes of the run; unlike the results, spans are not released mid-run
+        return {node_id: span["error"] for node_id, span in self.nodes.items() if span["error"] is not None}
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self.duration_ms = self._offset()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "flow_id": self.flow_id,
+            "flow_hash": self.flow_hash,
+            "start_time": self.start_time,
+            "status": self.status,
+            "error": self.error,
+            "duration_ms": self.duration_ms,
+            "nodes": list(self.nodes.values()),
+        }
+
+class TraceStore:
+    # The last TRACE_MAX_RUNS runs (including ones still in progress)
+    def __init__(self, max_runs: int):
+        self.max_runs = max_runs
+        self._runs: "OrderedDict[str, RunTrace]" = OrderedDict()
+
+    def add(self, trace: RunTrace):
+        self._runs[trace.run_id] = trace
+        while len(self._runs) > self.max_runs:
+            self._runs.popitem(last=False)
+
+    def get(self, run_id: str) -> Optional[RunTrace]:
+        return self._runs.get(run_id)
+
+    def list(self, flow_id: Optional[str] = None, limit: int = 50) -> List[RunTrace]:
+        traces = []
+        for trace in reversed(self._runs.values()):
+            if flow_id is None or trace.flow_id == flow_id:
+                traces.append(trace)
+                if len(traces) >= limit:
+                    break
+        return traces
+
+trace_store = TraceStore(get_settings().TRACE_MAX_RUNS)
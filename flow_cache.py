@@ -0,0 +1,107 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional
+from config import get_settings
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+class CachedPayload:
+    # Serialized JSON body of one flow version, plus compressed variants made on demand
+    def __init__(self, update_time: Optional[str], body: bytes, etag: str):
+        self.update_time = update_time
+        self.body = body
+        self.etag = etag
+        self.encoded: Dict[str, bytes] = {}
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        # A strong validator must differ per content coding (RFC 9110), so each variant gets its own
+        if encoding is None:
+            return self.etag
+        return self.etag[:-1] + "-" + encoding + '"'
+
+    def size(self) -> int:
+        return len(self.body) + sum(len(v) for v in self.encoded.values())
+
+class FlowPayloadCache:
+    # Pre-serialized read_flow responses keyed by flow id, valid for one update_time.
+    # LRU-bounded by total bytes; update/delete routes invalidate explicitly.
+    def __init__(self, max_bytes: int, compress_min_bytes: int):
+        self.max_bytes = max_bytes
+        self.compress_min_bytes = compress_min_bytes
+        self._entries: "OrderedDict[str, CachedPayload]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, flow_id: str, update_time: Optional[str]) -> Optional[CachedPayload]:
+        entry = self._entries.get(flow_id)
+        if entry is None or entry.update_time != update_time:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(flow_id)
+        return entry
+
+    def put(self, flow_id: str, update_time: Optional[str], body: bytes) -> CachedPayload:
+        self.invalidate(flow_id)
+        entry = CachedPayload(update_time, body, make_etag(body))
+        if entry.size() <= self.max_bytes:
+            self._entries[flow_id] = entry
+            self._bytes += entry.size()
+            self._evict()
+        return entry
+
+    def pick_encoding(self, entry: CachedPayload, accept_encoding: str) -> Optional[str]:
+        # br or gzip for large payloads, if the client accepts it
+        if len(entry.body) < self.compress_min_bytes:
+            return None
+        accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and (encoding != "br" or brotli is not None):
+                return encoding
+        return None
+
+    def encode(self, flow_id: str, entry: CachedPayload, encoding: str) -> bytes:
+        # The compressed bytes are made once and cached with the entry
+        if encoding not in entry.encoded:
+            if encoding == "br":
+                entry.encoded[encoding] = brotli.compress(entry.body, quality=5)
+            else:
+                entry.encoded[encoding] = gzip.compress(entry.body, compresslevel=6)
+            if self._entries.get(flow_id) is entry:
+                self._bytes += len(entry.encoded[encoding])
+                self._evict()
+        return entry.encoded[encoding]
+
+    def invalidate(self, flow_id: str):
+        entry = self._entries.pop(flow_id, None)
+        if entry is not None:
+            self._bytes -= entry.size()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+def make_etag(body: bytes) -> str:
+    # Strong validator: hash of the exact bytes served
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison as RFC 9110 asks for If-None-Match
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates
+
+_settings = get_settings()
+flow_payload_cache = FlowPayloadCache(_settings.FLOW_CACHE_MAX_BYTES, _settings.FLOW_COMPRESS_MIN_BYTES)
@@ -1,48 +1,71 @@
+import startup  # first, so the boot report covers every import below
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from database import create_db_and_tables
-from routers import flow, auth, component, variable, chat, web, base
+from database import create_db_and_tables, dispose_engines
+from engine.jobs import job_manager
+from engine.llm import close_clients
+from routers import flow, version, auth, component, variable, chat, batch, job, web, base, runtime
+import logging
+import math
 import time
-from collections import defaultdict
+import metrics
+import ratelimit
 
-# Simple Memory-based Rate Limiter
-RATE_LIMIT = 60  # requests per minute
-RATE_WINDOW = 60 # seconds
-request_counts = defaultdict(list)
+logger = logging.getLogger(__name__)
 
 def rate_limiter_middleware(request: Request):
-    client_ip = request.client.host
-    now = time.time()
-    
-    # Filter out timestamps older than window
-    request_counts[client_ip] = [t for t in request_counts[client_ip] if now - t < RATE_WINDOW]
-    
-    if len(request_counts[client_ip]) >= RATE_LIMIT:
-        raise HTTPException(status_code=429, detail="Too many requests. Please try again later.")
-    
-    request_counts[client_ip].append(now)
+    # Shared GCRA limiter, policy picked by route, keyed by user token or client IP
+    allowed, retry_after = ratelimit.check(ratelimit.policy_for_path(request.url.path), request)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Please try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
+    await job_manager.start()
+    startup.mark("ready")
+    logger.info(f"Worker ready: {startup.report()['marks']}")
     yield
+    await job_manager.stop()
+    await close_clients()
+    await dispose_engines()
 
 app = FastAPI(lifespan=lifespan)
 
 @app.middleware("http")
 async def add_rate_limit(request: Request, call_next):
-    # Exclude OPTIONS (CORS preflight) and Health check
-    if request.method != "OPTIONS" and request.url.path != "/health":
+    # Exclude OPTIONS (CORS preflight), Health check and the metrics scrape
+    if request.method != "OPTIONS" and request.url.path not in ("/health", "/metrics"):
          try:
             rate_limiter_middleware(request)
          except HTTPException as e:
-            return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+            return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
             
     response = await call_next(request)
     return response
 
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    # Outermost middleware, so rate-limited requests are counted too
+    metrics.HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec()
+        route_path = metrics.route_label(request.scope)
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - start, route_path, request.method)
+        metrics.HTTP_REQUESTS.inc(route_path, request.method, str(status))
+
 # CORS configuration
 origins = [
     "http://localhost:3000",
@@ -62,10 +85,14 @@ app.add_middleware(
 
 app.include_router(auth.router, prefix="/api/v1/user", tags=["User"])
 app.include_router(flow.router, prefix="/api/v1/flows", tags=["Flow"])
+app.include_router(version.router, prefix="/api/v1/flows", tags=["Flow Version"])
 app.include_router(component.router, prefix="/api/v1/component", tags=["Component"])
 app.include_router(variable.router, prefix="/api/v1/variable", tags=["Variable"])
 app.include_router(chat.router, prefix="/api/v1/workflow", tags=["Chat"])
+app.include_router(batch.router, prefix="/api/v1/workflow", tags=["Batch"])
+app.include_router(job.router, prefix="/api/v1/jobs", tags=["Job"])
 app.include_router(web.router, prefix="/api/v1/web", tags=["Web"])
+app.include_router(runtime.router, prefix="/api/v1/runtime", tags=["Runtime"])
 app.include_router(base.router, prefix="/api/v1", tags=["Base"])
 
 
@@ -77,3 +104,10 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+def read_metrics():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+startup.mark("imported")
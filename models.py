@@ -1,7 +1,10 @@
 from typing import Optional, List
-from sqlmodel import Field, SQLModel, JSON, Column
+from sqlmodel import Field, SQLModel, JSON, Column, Index, LargeBinary
 
 class Flow(SQLModel, table=True):
+    # Backs keyset pagination of the flow list (newest first)
+    __table_args__ = (Index("ix_flow_update_time_id", "update_time", "id"),)
+
     id: Optional[str] = Field(default=None, primary_key=True)
     name: str
     description: Optional[str] = None
@@ -11,8 +14,50 @@ class Flow(SQLModel, table=True):
     update_time: Optional[str] = None
     create_time: Optional[str] = None
     user_id: Optional[str] = None
+    version: int = 1  # bumped on every write; graph patches name the version they apply to
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str
     password: str
+
+class Job(SQLModel, table=True):
+    # Queue order for recovery after a restart: status, then priority, then age
+    __table_args__ = (Index("ix_job_status_priority", "status", "priority", "create_time"),)
+
+    id: Optional[str] = Field(default=None, primary_key=True)
+    flow_id: str = Field(index=True)
+    status: str = "queued"  # queued, running, succeeded, failed, cancelled
+    priority: int = 0  # higher runs first
+    inputs: Optional[dict] = Field(default={}, sa_column=Column(JSON))
+    result: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    error: Optional[str] = None
+    create_time: Optional[str] = None
+    start_time: Optional[str] = None
+    finish_time: Optional[str] = None
+    expires_at: Optional[float] = Field(default=None, index=True)  # unix time the result is dropped
+    # Lease of the worker running the job: owner renews lease_until while it runs; a
+    # running job whose lease has expired (its worker died) is queued again by any worker
+    owner: Optional[str] = None
+    lease_until: Optional[float] = None
+    cancel_requested: bool = False  # set by any worker, acted on by the owner
+
+class FlowChunk(SQLModel, table=True):
+    # One node, edge list or the remaining graph keys, stored once per distinct content:
+    # hash is the sha256 of its canonical JSON, data that JSON zlib-compressed
+    hash: str = Field(primary_key=True)
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    size: int = 0  # uncompressed bytes
+    create_time: Optional[str] = None
+
+class FlowVersion(SQLModel, table=True):
+    # A saved state of a flow: its chunk hashes in order, not the graph itself
+    __table_args__ = (Index("ix_flowversion_flow_version", "flow_id", "version", unique=True),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    flow_id: str
+    version: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+    manifest: Optional[dict] = Field(default={}, sa_column=Column(JSON))
+    create_time: Optional[str] = None
@@ -0,0 +1,162 @@
+import copy
+from typing import Any, Dict, List, Tuple
+
+# Delta updates of a flow graph (`Flow.data`): RFC 6902 JSON Patch, or a
+# node/edge-level diff. Both mutate the given document in place; callers pass
+# a document they own and discard it if a PatchError is raised.
+
+class PatchError(Exception):
+    pass
+
+def _parse_pointer(pointer: str) -> List[str]:
+    # RFC 6901: "" is the whole document, "/a/b~1c" -> ["a", "b/c"]
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer: {pointer}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")]
+
+def _array_index(container: list, token: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token[0] == "0"):
+        raise PatchError(f"Invalid array index: {token}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"Array index out of range: {token}")
+    return index
+
+def _resolve(doc: Any, tokens: List[str]) -> Any:
+    for token in tokens:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[_array_index(doc, token, allow_end=False)]
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+    return doc
+
+def _parent(doc: Any, pointer: str) -> Tuple[Any, str]:
+    tokens = _parse_pointer(pointer)
+    if not tokens:
+        raise PatchError("Operation on the document root is not supported")
+    return _resolve(doc, tokens[:-1]), tokens[-1]
+
+def _add(doc: Any, pointer: str, value: Any):
+    parent, key = _parent(doc, pointer)
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_array_index(parent, key, allow_end=True), value)
+    else:
+        raise PatchError(f"Cannot add to {pointer}")
+
+def _remove(doc: Any, pointer: str) -> Any:
+    parent, key = _parent(doc, pointer)
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise PatchError(f"Path not found: {pointer}")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_array_index(parent, key, allow_end=False))
+    raise PatchError(f"Cannot remove {pointer}")
+
+def apply_json_patch(doc: Dict[str, Any], operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    for operation in operations:
+        op, path = operation.get("op"), operation.get("path")
+        if not isinstance(path, str):
+            raise PatchError(f"Operation without a path: {operation}")
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise PatchError(f"'{op}' operation without a value: {operation}")
+
+        if op == "add":
+            _add(doc, path, operation["value"])
+        elif op == "remove":
+            _remove(doc, path)
+        elif op == "replace":
+            _remove(doc, path)
+            _add(doc, path, operation["value"])
+        elif op in ("move", "copy"):
+            source = operation.get("from")
+            if not isinstance(source, str):
+                raise PatchError(f"'{op}' operation without 'from': {operation}")
+            if op == "move":
+                if path.startswith(source + "/"):
+                    raise PatchError(f"Cannot move {source} into itself")
+                value = _remove(doc, source)
+            else:
+                value = copy.deepcopy(_resolve(doc, _parse_pointer(source)))
+            _add(doc, path, value)
+        elif op == "test":
+            if _resolve(doc, _parse_pointer(path)) != operation["value"]:
+                raise PatchError(f"Test failed at {path}")
+        else:
+            raise PatchError(f"Unknown patch operation: {op}")
+    return doc
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    # RFC 7396 JSON Merge Patch: objects merge recursively, null deletes a key
+    if not isinstance(patch, dict):
+        return patch
+    if not isinstance(target, dict):
+        target = {}
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = merge_patch(target.get(key), value)
+    return target
+
+def _edge_matches(edge: Dict[str, Any], selector: Dict[str, Any]) -> bool:
+    # Edges are addressed by id when they have one, else by source/target (and handles, if given)
+    return all(edge.get(key) == value for key, value in selector.items())
+
+def apply_graph_diff(doc: Dict[str, Any], diff: Dict[str, Any]) -> Dict[str, Any]:
+    # {"nodes": {"add": [node], "update": [{"id", ...merge patch}], "remove": [id]},
+    #  "edges": {"add": [edge], "remove": [{"id"} | {"source", "target"}]}}
+    nodes = doc.setdefault("nodes", [])
+    edges = doc.setdefault("edges", [])
+    node_diff = diff.get("nodes") or {}
+    edge_diff = diff.get("edges") or {}
+    positions = {node.get("id"): i for i, node in enumerate(nodes)}
+
+    removed = set(node_diff.get("remove") or [])
+    for node_id in removed:
+        if node_id not in positions:
+            raise PatchError(f"Cannot remove unknown node: {node_id}")
+    if removed:
+        nodes[:] = [node for node in nodes if node.get("id") not in removed]
+        # Edges of removed nodes go with them
+        edges[:] = [e for e in edges if e.get("source") not in removed and e.get("target") not in removed]
+        positions = {node.get("id"): i for i, node in enumerate(nodes)}
+
+    for update in node_diff.get("update") or []:
+        node_id = update.get("id")
+        if node_id not in positions:
+            raise PatchError(f"Cannot update unknown node: {node_id}")
+        changes = {key: value for key, value in update.items() if key != "id"}
+        nodes[positions[node_id]] = merge_patch(nodes[positions[node_id]], changes)
+
+    for node in node_diff.get("add") or []:
+        if not isinstance(node, dict) or "id" not in node or "type" not in node:
+            raise PatchError(f"Added node needs 'id' and 'type': {node}")
+        if node["id"] in positions:
+            raise PatchError(f"Node already exists: {node['id']}")
+        positions[node["id"]] = len(nodes)
+        nodes.append(node)
+
+    for selector in edge_diff.get("remove") or []:
+        if not isinstance(selector, dict) or not selector:
+            raise PatchError(f"Invalid edge selector: {selector}")
+        kept = [edge for edge in edges if not _edge_matches(edge, selector)]
+        if len(kept) == len(edges):
+            raise PatchError(f"Cannot remove unknown edge: {selector}")
+        edges[:] = kept
+
+    for edge in edge_diff.get("add") or []:
+        if not isinstance(edge, dict) or edge.get("source") not in positions or edge.get("target") not in positions:
+            raise PatchError(f"Edge references unknown node: {edge}")
+        edges.append(edge)
+    return doc
@@ -0,0 +1,82 @@
+import json
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+from starlette.requests import HTTPConnection
+from config import get_settings
+import metrics
+
+class RateLimitPolicy:
+    def __init__(self, name: str, limit: int, window: float):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.window = float(window)
+        # GCRA: one request "costs" window/limit seconds, up to `limit` may burst
+        self.interval = self.window / self.limit
+
+class RateLimiter:
+    # Generic Cell Rate Algorithm: a single float (theoretical arrival time)
+    # per (policy, key), so every check is O(1) and memory per client is constant.
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._tat: "OrderedDict[Tuple[str, str], float]" = OrderedDict()  # ordered by last update
+
+    def hit(self, policy: RateLimitPolicy, key: str) -> Tuple[bool, float]:
+        now = time.monotonic()
+        self._evict(now)
+
+        slot = (policy.name, key)
+        tat = max(self._tat.get(slot, now), now)
+        new_tat = tat + policy.interval
+        allow_at = new_tat - policy.window
+        if allow_at > now:
+            return False, allow_at - now
+
+        self._tat[slot] = new_tat
+        self._tat.move_to_end(slot)
+        return True, 0.0
+
+    def _evict(self, now: float):
+        # A key whose TAT is in the past is indistinguishable from a new one, so it can go.
+        # Entries are ordered by last update; stop at the first one still active.
+        while self._tat:
+            slot, tat = next(iter(self._tat.items()))
+            if tat > now and len(self._tat) <= self.max_keys:
+                break
+            self._tat.popitem(last=False)
+
+    def __len__(self):
+        return len(self._tat)
+
+def _parse_routes(raw: str) -> List[Tuple[str, RateLimitPolicy]]:
+    # RATE_LIMIT_ROUTES: JSON object of path prefix -> [limit, window_seconds]
+    routes = []
+    for prefix, (limit, window) in (json.loads(raw) if raw else {}).items():
+        routes.append((prefix, RateLimitPolicy(f"route:{prefix}", limit, window)))
+    # Longest prefix wins
+    routes.sort(key=lambda item: len(item[0]), reverse=True)
+    return routes
+
+_settings = get_settings()
+limiter = RateLimiter(_settings.RATE_LIMIT_MAX_KEYS)
+HTTP_POLICY = RateLimitPolicy("http", _settings.RATE_LIMIT, _settings.RATE_WINDOW)
+WS_POLICY = RateLimitPolicy("ws", _settings.WS_RATE_LIMIT, _settings.WS_RATE_WINDOW)
+WS_MESSAGE_POLICY = RateLimitPolicy("ws_message", _settings.WS_MESSAGE_RATE_LIMIT, _settings.WS_MESSAGE_RATE_WINDOW)
+ROUTE_POLICIES = _parse_routes(_settings.RATE_LIMIT_ROUTES)
+
+def policy_for_path(path: str) -> RateLimitPolicy:
+    for prefix, policy in ROUTE_POLICIES:
+        if path.startswith(prefix):
+            return policy
+    return HTTP_POLICY
+
+def client_key(conn: HTTPConnection) -> str:
+    # Limited per client IP. Bearer tokens are not verified (login hands out random
+    # mock tokens), so keying on them would let a client dodge the limit per request.
+    return "ip:" + (conn.client.host if conn.client else "unknown")
+
+def check(policy: RateLimitPolicy, conn: HTTPConnection) -> Tuple[bool, float]:
+    allowed, retry_after = limiter.hit(policy, client_key(conn))
+    if not allowed:
+        metrics.RATE_LIMIT_REJECTIONS.inc(policy.name)
+    return allowed, retry_after
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
-from sqlmodel import Session, select
-from database import get_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session
 from models import User
 import uuid
 
@@ -23,16 +24,16 @@ class UserInfoResponse(BaseModel):
     data: dict
 
 @router.post("/login")
-def login(request: LoginRequest, session: Session = Depends(get_session)):
+async def login(request: LoginRequest, session: AsyncSession = Depends(get_async_session)):
     # Simple mock login for MVP
     # In real app, hash password and verify
-    user = session.exec(select(User).where(User.username == request.user_name)).first()
+    user = (await session.exec(select(User).where(User.username == request.user_name))).first()
     if not user:
         # Auto-register for MVP convenience
         user = User(username=request.user_name, password=request.password)
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
+        await session.refresh(user)
     
     token = "mock-token-" + str(uuid.uuid4())
     return {
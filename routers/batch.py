@@ -0,0 +1,137 @@
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import csv
+import io
+import json
+import orjson
+import logging
+from config import get_settings
+from engine.admission import queue_timeout as llm_queue_timeout
+from engine.executor_cache import load_executor
+from engine.tracing import RunTrace
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+INPUT_KEYS = ("input", "input_value", "text", "message")
+
+def to_inputs(row: Any) -> Dict[str, Any]:
+    # A row is either a bare value or an object; its input text goes where the
+    # chat endpoint would put the user's message, other keys are passed along
+    if not isinstance(row, dict):
+        return {"input_value": str(row), "text": str(row)}
+    inputs = dict(row)
+    for key in INPUT_KEYS:
+        if key in row:
+            inputs["input_value"] = inputs["text"] = str(row[key])
+            break
+    return inputs
+
+def parse_csv(content: bytes) -> List[Dict[str, Any]]:
+    # A CSV record may span lines, so the file is parsed up front and rejected as a whole
+    return list(csv.DictReader(io.StringIO(content.decode("utf-8-sig")), strict=True))
+
+def parse_rows(content: bytes, csv_rows: Optional[List[Dict[str, Any]]]) -> Iterator[Tuple[int, Optional[Any], Optional[str]]]:
+    # Yields (index, row, parse_error); NDJSON is decoded line by line so a bad
+    # line becomes an error row instead of failing the whole batch
+    if csv_rows is not None:
+        for index, row in enumerate(csv_rows):
+            yield index, row, None
+        return
+    index = 0
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        row, error = None, None
+        try:
+            row = json.loads(line.decode("utf-8-sig"))
+        except UnicodeDecodeError as e:
+            error = f"Invalid UTF-8: {e}"
+        except ValueError as e:
+            error = f"Invalid JSON: {e}"
+        yield index, row, error
+        index += 1
+
+@router.post("/batch/{flow_id}")
+async def run_batch(
+    flow_id: str,
+    file: UploadFile = File(...),
+    concurrency: Optional[int] = Query(None, ge=1)
+):
+    executor = await load_executor(flow_id)
+    if executor is None:
+        raise HTTPException(status_code=404, detail="Flow not found")
+
+    settings = get_settings()
+    limit = min(concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+    filename = (file.filename or "").lower()
+    is_csv = filename.endswith(".csv") or (file.content_type or "").startswith("text/csv")
+    content = await file.read()
+    # Checked before streaming starts: once the 200 is sent, a failure could only end the body early
+    csv_rows = None
+    if is_csv:
+        try:
+            csv_rows = parse_csv(content)
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid CSV file: {e}")
+
+    async def run_row(index: int, row: Any) -> Dict[str, Any]:
+        try:
+            trace = RunTrace(executor.flow_id, executor.plan.flow_hash)
+            results = await executor.execute(to_inputs(row), trace=trace)
+        except Exception as e:
+            return {"index": index, "status": "error", "error": str(e)}
+        final_id = executor.final_node_id(results)
+        record = {"index": index, "status": "ok", "output": results[final_id] if final_id else {}}
+        # Intermediate outputs are released during the run, the trace keeps every node's error
+        errors = trace.errors()
+        if errors:
+            record["status"] = "error"
+            record["error"] = errors
+        return record
+
+    async def generate():
+        # Rows run with bounded concurrency and are streamed back in completion order.
+        # LLM calls still go through admission, but may queue up to BATCH_LLM_QUEUE_TIMEOUT.
+        llm_queue_timeout.set(settings.BATCH_LLM_QUEUE_TIMEOUT)
+        slots = asyncio.Semaphore(limit)
+        done: asyncio.Queue = asyncio.Queue()
+        tasks = set()
+
+        async def guarded(index: int, row: Any):
+            try:
+                done.put_nowait(await run_row(index, row))
+            finally:
+                slots.release()
+
+        async def produce():
+            try:
+                for index, row, error in parse_rows(content, csv_rows):
+                    if error:
+                        done.put_nowait({"index": index, "status": "error", "error": error})
+                        continue
+                    await slots.acquire()
+                    task = asyncio.create_task(guarded(index, row))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                done.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                record = await done.get()
+                if record is None:
+                    break
+                yield orjson.dumps(record, default=str, option=orjson.OPT_APPEND_NEWLINE)
+            producer.result()
+        finally:
+            # Client went away or the batch finished: stop whatever is still running
+            producer.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
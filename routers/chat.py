@@ -1,47 +1,190 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from collections import deque
+import asyncio
+import contextlib
 import json
 import logging
+import math
+import time
+from config import get_settings
+import metrics
+import ratelimit
+from engine.budget import RunAborted
 from engine.executor import GraphExecutor
+from engine.executor_cache import load_executor
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.websocket("/chat/{flow_id}")
-async def websocket_endpoint(websocket: WebSocket, flow_id: str):
-    await websocket.accept()
-    client_ip = websocket.client.host
-    logger.info(f"WebSocket connected for flow {flow_id} from {client_ip}")
+class StreamCoalescer:
+    # Buffers token events into fewer, larger stream_msg frames:
+    # flush on STREAM_MIN_CHARS, on STREAM_FLUSH_INTERVAL, or when the node changes
+    def __init__(self, websocket: WebSocket):
+        settings = get_settings()
+        self.websocket = websocket
+        self.min_chars = settings.STREAM_MIN_CHARS
+        self.interval = settings.STREAM_FLUSH_INTERVAL
+        self.chunks = []
+        self.size = 0
+        self.node_id = None
+        self.last_flush = time.monotonic()
+
+    async def add(self, node_id: str, chunk: str):
+        if node_id != self.node_id:
+            await self.flush()
+            self.node_id = node_id
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size >= self.min_chars or time.monotonic() - self.last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        if self.chunks:
+            await self.websocket.send_json({
+                "category": "stream_msg",
+                "type": "stream",
+                "message": "".join(self.chunks),
+                "node_id": self.node_id,
+                "receiver": None
+            })
+        self.chunks = []
+        self.size = 0
+        self.last_flush = time.monotonic()
+
+async def watch_client(websocket: WebSocket) -> str:
+    # Reads the socket while a run is in progress: "disconnect" when the client
+    # goes away, "stop"/"close" when it asks for that; other messages are ignored
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return "disconnect"
+        try:
+            action = json.loads(message.get("text") or "{}").get("action")
+        except (ValueError, AttributeError):
+            action = None
+        if action in ("stop", "close"):
+            return action
+        logger.info(f"Ignoring message received during a run: {action}")
+
+async def run_turn(websocket: WebSocket, executor: GraphExecutor, start_node_id: Optional[str],
+                   initial_inputs: Dict[str, Any], input_data: Dict[str, Any], chat_id: Optional[str],
+                   incremental: bool = False) -> Optional[str]:
+    # 6. Run Executor
+    # Send 'start' message
+    await websocket.send_json({"type": "begin", "category": "processing"})
     
-    # Global Rate Limit for WS (IP based)
-    import time
-    from collections import defaultdict, deque
+    # Execute
+    # Pass user input to executor
+    # We assume the first node takes "input_value" or similar
+    # Tokens are forwarded as they are produced, every node reports node_run start/end
+    async def forward() -> Dict[str, Any]:
+        coalescer = StreamCoalescer(websocket)
+        result = {}
+        # aclosing: leaving the loop early (cancelled) cancels the run itself
+        async with contextlib.aclosing(executor.stream(initial_inputs, incremental=incremental)) as events:
+            async for event in events:
+                if event["type"] == "token":
+                    await coalescer.add(event["node_id"], event["chunk"])
+                    continue
+                # Node boundaries flush whatever is buffered
+                await coalescer.flush()
+                if event["type"] == "node_start":
+                    await websocket.send_json({
+                        "category": "node_run",
+                        "type": "start",
+                        "message": {"node_id": event["node_id"], "node_type": event["node_type"], "run_id": event["run_id"]}
+                    })
+                elif event["type"] == "node_end":
+                    message = {
+                        "node_id": event["node_id"],
+                        "node_type": event["node_type"],
+                        "run_id": event["run_id"],
+                        "span": event["span"]
+                    }
+                    if event["node_id"] == start_node_id:
+                        message["input_data"] = input_data
+                    await websocket.send_json({"category": "node_run", "type": "end", "message": message})
+                elif event["type"] == "run_end":
+                    result = event["result"]
+        await coalescer.flush()
+        return result
+
+    # The client is watched while the run goes on: a disconnect or "stop" cancels
+    # every running node (and LLM call) instead of finishing a run nobody reads
+    run_task = asyncio.create_task(forward())
+    watch_task = asyncio.create_task(watch_client(websocket))
+    try:
+        await asyncio.wait({run_task, watch_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (run_task, watch_task):
+            task.cancel()
+        await asyncio.gather(run_task, watch_task, return_exceptions=True)
+
+    if run_task.cancelled():
+        action = watch_task.result()
+        logger.info(f"Run cancelled by client: {action}")
+        if action == "disconnect":
+            raise WebSocketDisconnect()
+        if action == "close":
+            await websocket.close(code=1000)
+            raise WebSocketDisconnect(1000)
+        await websocket.send_json({"type": "close", "category": "processing", "chat_id": chat_id, "stopped": True})
+        return None
+    try:
+        result = run_task.result()
+    except RunAborted as e:
+        # Deadline or budget hit: the run stopped, the session can go on
+        await websocket.send_json({
+            "category": "error",
+            "message": {"status_code": e.status_code, "message": str(e)}
+        })
+        await websocket.send_json({"type": "close", "category": "processing", "chat_id": chat_id})
+        return None
     
-    # Initialize global state if not exists (hacky for this function scope but works if module level)
-    # Better: Use a module-level variable. 
-    # But for replace_file, I'll assume I can access a global or declare it here? 
-    # No, declare it module level or use an attribute.
-    # Let's use a simple pattern: attribute on the function or module level dict.
+    if not start_node_id:
+        return None
     
-    global ws_request_counts 
-    if 'ws_request_counts' not in globals():
-        ws_request_counts = defaultdict(list)
-        
-    WS_RATE_LIMIT = 10
-    WS_RATE_WINDOW = 60
+    # 7. Send Response
+    # Assume result contains 'result' or 'text'
+    final_text = str(result.get("result", result))
     
-    try:
-        # Check Rate Limit on Connect/Init
-        now = time.time()
-        # Clean old
-        ws_request_counts[client_ip] = [t for t in ws_request_counts[client_ip] if now - t < WS_RATE_WINDOW]
-        
-        if len(ws_request_counts[client_ip]) >= WS_RATE_LIMIT:
-             logger.warning(f"WS Rate Limit exceeded for {client_ip}")
-             await websocket.close(code=1008, reason="Rate limit exceeded")
-             return
-        ws_request_counts[client_ip].append(now)
+    # Final frame carries the full answer for clients that ignore partial frames
+    await websocket.send_json({
+        "category": "stream_msg",
+        "type": "end",
+        "message": final_text,
+        "node_id": "final_node",
+        "receiver": None
+    })
+    
+    # Send Over/Close
+    await websocket.send_json({
+        "type": "close",
+        "category": "processing",
+        "chat_id": chat_id
+    })
+    return final_text
+
+@router.websocket("/chat/{flow_id}")
+async def websocket_endpoint(websocket: WebSocket, flow_id: str):
+    client_ip = websocket.client.host
+
+    # Rate limit the handshake itself; closing before accept rejects it with 403
+    allowed, _ = ratelimit.check(ratelimit.WS_POLICY, websocket)
+    if not allowed:
+        logger.warning(f"WS Rate Limit exceeded for {client_ip}")
+        await websocket.close(code=1008, reason="Rate limit exceeded")
+        return
 
+    await websocket.accept()
+    logger.info(f"WebSocket connected for flow {flow_id} from {client_ip}")
+    metrics.WS_ACTIVE_SESSIONS.inc()
+    # Session mode keeps the conversation history of this connection only; it is
+    # gone with the connection, and SESSION_HISTORY_MESSAGES bounds it
+    history = None
+
+    try:
         # 1. Wait for init_data or check_status
         data = await websocket.receive_json()
         
@@ -51,14 +194,15 @@ async def websocket_endpoint(websocket: WebSocket, flow_id: str):
              # Just ack?
              pass
         
-        flow_data = data.get("data", {})
-        if not flow_data and data.get("action") == "init_data":
-             # If data is empty, maybe fetch from DB?
-             # For now assume frontend sends it as per ChatPane.tsx logic
-             logger.warning("No flow data in init_data")
-        
         # 2. Initialize Executor
-        executor = GraphExecutor(flow_data)
+        # Stored flows run from the database through the warm executor cache;
+        # the graph in init_data is only used for flows that were never saved
+        executor = await load_executor(flow_id)
+        if executor is None:
+            flow_data = data.get("data", {})
+            if not flow_data and data.get("action") == "init_data":
+                logger.warning("No flow data in init_data")
+            executor = GraphExecutor(flow_data, flow_id=flow_id)
         
         # 3. Check for Input Node
         # We need to ask for input if we don't present it?
@@ -66,88 +210,88 @@ async def websocket_endpoint(websocket: WebSocket, flow_id: str):
         # Let's see if we can identify Input Node.
         input_nodes = [n for n in executor.nodes if "input" in n["type"].lower() or "start" in n["type"].lower()]
         start_node_id = input_nodes[0]["id"] if input_nodes else None
-        
-        if start_node_id:
-            # 4. Request Input
-            # Construct input_schema (mock)
-            # This triggers ChatInput to unlock and let user type
-            req_msg = {
-                "category": "input",
-                "message_id": "req_input_1",
-                "message": {
-                    "node_id": start_node_id,
-                    "input_schema": {
-                        "tab": "dialog_input", # or form_input
-                        # mock value schema
-                        "value": [{"key": "dialog_file_accept", "value": "all"}]
+
+        # Session mode ("session": true in init_data or ?session=1): the connection
+        # stays open and serves one input -> run turn after another
+        chat_id = data.get("chat_id")
+        session_mode = bool(start_node_id) and (
+            bool(data.get("session")) or websocket.query_params.get("session") in ("1", "true")
+        )
+        if session_mode:
+            history = deque(maxlen=get_settings().SESSION_HISTORY_MESSAGES)
+        # Editor re-runs ("incremental": true) reuse outputs of nodes that did not change
+        incremental = bool(data.get("incremental"))
+        idle_timeout = get_settings().SESSION_IDLE_TIMEOUT
+        turn = 0
+
+        while True:
+            turn += 1
+            user_input_text = ""
+            if start_node_id:
+                # 4. Request Input
+                # Construct input_schema (mock)
+                # This triggers ChatInput to unlock and let user type
+                req_msg = {
+                    "category": "input",
+                    "message_id": f"req_input_{turn}",
+                    "message": {
+                        "node_id": start_node_id,
+                        "input_schema": {
+                            "tab": "dialog_input", # or form_input
+                            # mock value schema
+                            "value": [{"key": "dialog_file_accept", "value": "all"}]
+                        }
                     }
                 }
-            }
-            await websocket.send_json(req_msg)
-            
-            # 5. Wait for User Input
-            input_msg = await websocket.receive_json()
-            logger.info(f"Received input: {input_msg.get('action')}")
-            
-            # Extract user text
-            # Structure: data[node_id].message
-            user_input_text = ""
-            if "data" in input_msg:
-                node_inputs = input_msg["data"].get(start_node_id, {})
-                user_input_text = node_inputs.get("message", "")
+                await websocket.send_json(req_msg)
                 
-            initial_inputs = {"input_value": user_input_text, "text": user_input_text}
-        else:
-            # No input node, run automatically
-            initial_inputs = {}
-            
-        # 6. Run Executor
-        # Send 'start' message
-        await websocket.send_json({"type": "begin", "category": "processing"})
-        
-        # Execute
-        # Pass user input to executor
-        # We assume the first node takes "input_value" or similar
-        
-        # Mock Node Runs
-        # In a real loop we would send node_run events
-        if start_node_id:
-            await websocket.send_json({
-                "category": "node_run",
-                "type": "start",
-                "message": {"node_id": start_node_id}
-            })
-        
-        result = await executor.run(initial_inputs)
-        
-        if start_node_id:
-            await websocket.send_json({
-                "category": "node_run",
-                "type": "end",
-                "message": {
-                    "node_id": start_node_id, 
-                    "input_data": initial_inputs
-                }
-            })
-            
-            # 7. Send Response
-            # Assume result contains 'result' or 'text'
-            final_text = str(result.get("result", result))
-            
-            # Send stream message (or simple answer)
-            await websocket.send_json({
-                "category": "stream_msg",
-                "message": final_text,
-                "node_id": "final_node",
-                "receiver": None
-            })
-            
-            # Send Over/Close
-            await websocket.send_json({
-                "type": "close",
-                "category": "processing",
-                "chat_id": data.get("chat_id")
-            })
+                # 5. Wait for User Input, closing idle connections
+                try:
+                    input_msg = await asyncio.wait_for(websocket.receive_json(), idle_timeout)
+                except asyncio.TimeoutError:
+                    logger.info(f"Closing idle WebSocket for flow {flow_id}")
+                    await websocket.close(code=1000, reason="Idle timeout")
+                    return
+                logger.info(f"Received input: {input_msg.get('action')}")
+                if input_msg.get("action") in ("close", "stop"):
+                    await websocket.close(code=1000)
+                    return
+                
+                # Extract user text
+                # Structure: data[node_id].message
+                if "data" in input_msg:
+                    node_inputs = input_msg["data"].get(start_node_id, {})
+                    user_input_text = node_inputs.get("message", "")
+                    
+                initial_inputs = {"input_value": user_input_text, "text": user_input_text}
+            else:
+                # No input node, run automatically
+                initial_inputs = {}
+            input_data = dict(initial_inputs)
+            if history is not None:
+                initial_inputs["history"] = list(history)
+
+            # Every message (not every connection) counts against the message limit
+            allowed, retry_after = ratelimit.check(ratelimit.WS_MESSAGE_POLICY, websocket)
+            if not allowed:
+                logger.warning(f"WS message Rate Limit exceeded for {client_ip}")
+                await websocket.send_json({
+                    "category": "error",
+                    "message": {"status_code": 429, "message": f"Too many messages. Retry in {math.ceil(retry_after)}s"}
+                })
+                if session_mode:
+                    continue
+                await websocket.close(code=1008, reason="Rate limit exceeded")
+                return
+
+            final_text = await run_turn(
+                websocket, executor, start_node_id, initial_inputs, input_data, chat_id, incremental
+            )
+            if history is not None and final_text is not None:
+                history.append({"role": "user", "content": user_input_text})
+                history.append({"role": "assistant", "content": final_text})
+            if not session_mode:
+                break
 
     except WebSocketDisconnect:
         logger.info(f"Client disconnected {flow_id}")
@@ -157,4 +301,5 @@ async def websocket_endpoint(websocket: WebSocket, flow_id: str):
             "category": "error",
             "message": {"status_code": 500, "message": str(e)}
         })
-
+    finally:
+        metrics.WS_ACTIVE_SESSIONS.dec()
@@ -1,10 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlmodel import select, func, tuple_, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import column, literal_column, table, text
 from typing import List, Optional
 from pydantic import BaseModel
-from database import get_session
-from models import Flow
+from database import get_async_session
+from models import Flow, FlowVersion
+from engine.executor_cache import executor_cache
+from engine.memo import node_memo
+from flow_cache import etag_matches, flow_payload_cache
+from patching import PatchError, apply_graph_diff, apply_json_patch
+from versioning import VersionConflict, manifest_hashes, prune_chunks, record_version, save_flow
+import search
 from datetime import datetime
+import base64
+import copy
+import json
+import orjson
 import uuid
 
 router = APIRouter()
@@ -14,6 +26,10 @@ class FlowCreate(BaseModel):
     description: Optional[str] = None
     data: Optional[dict] = {}
 
+class FlowUpdate(FlowCreate):
+    # Full save; with `version` set it only applies if the flow is still at that version
+    version: Optional[int] = None
+
 class FlowResponse(BaseModel):
     id: str
     name: str
@@ -23,32 +39,118 @@ class FlowResponse(BaseModel):
     user_id: Optional[str]
     update_time: Optional[str]
     create_time: Optional[str]
+    version: Optional[int] = None
+
+class FlowGraphPatch(BaseModel):
+    # Exactly one of `patch` (RFC 6902 operations on the graph in `data`) or
+    # `diff` (node/edge-level changes), applied only if the flow is still at `version`
+    version: int
+    patch: Optional[List[dict]] = None
+    diff: Optional[dict] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+
+class FlowPatchResponse(BaseModel):
+    id: str
+    version: int
+    update_time: Optional[str]
+
+class FlowSummary(BaseModel):
+    # List view: everything but the (potentially large) graph in `data`
+    id: str
+    name: str
+    description: Optional[str]
+    status: int
+    logo: Optional[str]
+    user_id: Optional[str]
+    update_time: Optional[str]
+    create_time: Optional[str]
+    version: Optional[int] = None
 
 class FlowListResponse(BaseModel):
-    data: List[FlowResponse]
+    data: List[FlowSummary]
     total: int
+    next_cursor: Optional[str] = None
+
+MAX_PAGE_SIZE = 200
+
+flow_fts = table("flow_fts", column("rowid"))
+
+SUMMARY_COLUMNS = (
+    Flow.id, Flow.name, Flow.description, Flow.status, Flow.logo,
+    Flow.user_id, Flow.update_time, Flow.create_time, Flow.version
+)
+
+def encode_cursor(update_time: Optional[str], flow_id: str) -> str:
+    raw = json.dumps([update_time or "", flow_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        update_time, flow_id = json.loads(base64.urlsafe_b64decode(padded))
+        return update_time, flow_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.get("/", response_model=FlowListResponse)
-def read_flows(
-    page_num: int = 1,
-    page_size: int = 20,
+async def read_flows(
+    page_num: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
     name: Optional[str] = None,
-    session: Session = Depends(get_session)
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
 ):
-    query = select(Flow)
+    if name and search.FTS_ENABLED:
+        expression = search.match_expression(name)
+        if expression:
+            return await search_flows(expression, page_num, page_size, session)
+
+    filters = []
     if name:
-        query = query.where(Flow.name.contains(name))
-    
-    # Calculate offset
-    offset = (page_num - 1) * page_size
-    flows = session.exec(query.offset(offset).limit(page_size)).all()
-    # In a real app, count efficiently. Here just fetching all for count is okay for Lite
-    total = len(session.exec(select(Flow)).all()) 
-    
-    return {"data": flows, "total": total}
+        filters.append(Flow.name.contains(name))
+
+    total = (await session.exec(select(func.count()).select_from(Flow).where(*filters))).one()
+
+    # Newest first; (update_time, id) is unique and backed by ix_flow_update_time_id
+    query = (
+        select(*SUMMARY_COLUMNS)
+        .where(*filters)
+        .order_by(Flow.update_time.desc(), Flow.id.desc())
+        .limit(page_size)
+    )
+    if cursor:
+        # Keyset pagination: seek past the last row of the previous page
+        query = query.where(tuple_(Flow.update_time, Flow.id) < decode_cursor(cursor))
+    else:
+        query = query.offset((page_num - 1) * page_size)
+
+    rows = (await session.exec(query)).all()
+    next_cursor = None
+    if rows and len(rows) == page_size:
+        next_cursor = encode_cursor(rows[-1].update_time, rows[-1].id)
+
+    return {"data": [dict(row._mapping) for row in rows], "total": total, "next_cursor": next_cursor}
+
+async def search_flows(expression: str, page_num: int, page_size: int, session: AsyncSession):
+    # Ranked full-text search over name and description; name hits weigh more
+    match = text("flow_fts MATCH :expression").bindparams(expression=expression)
+    on_fts = flow_fts.c.rowid == literal_column("flow.rowid")
+
+    total = (await session.exec(select(func.count()).select_from(Flow).join(flow_fts, on_fts).where(match))).one()
+    query = (
+        select(*SUMMARY_COLUMNS)
+        .join(flow_fts, on_fts)
+        .where(match)
+        .order_by(func.bm25(literal_column("flow_fts"), 10.0, 1.0), Flow.update_time.desc())
+        .offset((page_num - 1) * page_size)
+        .limit(page_size)
+    )
+    rows = (await session.exec(query)).all()
+    return {"data": [dict(row._mapping) for row in rows], "total": total, "next_cursor": None}
 
 @router.post("/", response_model=FlowResponse)
-def create_flow(flow: FlowCreate, session: Session = Depends(get_session)):
+async def create_flow(flow: FlowCreate, session: AsyncSession = Depends(get_async_session)):
     db_flow = Flow(
         id=str(uuid.uuid4()),
         name=flow.name,
@@ -58,38 +160,109 @@ def create_flow(flow: FlowCreate, session: Session = Depends(get_session)):
         update_time=datetime.now().isoformat()
     )
     session.add(db_flow)
-    session.commit()
-    session.refresh(db_flow)
+    await record_version(session, db_flow.id, 1, db_flow.name, db_flow.description, db_flow.data)
+    await session.commit()
+    await session.refresh(db_flow)
     return db_flow
 
 @router.get("/{flow_id}", response_model=FlowResponse)
-def read_flow(flow_id: str, session: Session = Depends(get_session)):
-    flow = session.get(Flow, flow_id)
-    if not flow:
+async def read_flow(flow_id: str, request: Request, session: AsyncSession = Depends(get_async_session)):
+    # Only update_time is read per request; the serialized body comes from the
+    # payload cache, and a matching If-None-Match gets a bodyless 304
+    row = (await session.exec(select(Flow.id, Flow.update_time).where(Flow.id == flow_id))).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Flow not found")
-    return flow
+    update_time = row[1]
+
+    entry = flow_payload_cache.get(flow_id, update_time)
+    if entry is None:
+        flow = await session.get(Flow, flow_id)
+        if not flow:
+            raise HTTPException(status_code=404, detail="Flow not found")
+        body = orjson.dumps(FlowResponse.model_validate(flow, from_attributes=True).model_dump())
+        entry = flow_payload_cache.put(flow_id, flow.update_time, body)
+
+    # The ETag is the one of the variant this request would get
+    encoding = flow_payload_cache.pick_encoding(entry, request.headers.get("accept-encoding", ""))
+    etag = entry.etag_for(encoding)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    content = entry.body
+    if encoding:
+        content = flow_payload_cache.encode(flow_id, entry, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=headers)
 
 @router.patch("/{flow_id}", response_model=FlowResponse)
-def update_flow(flow_id: str, flow_update: FlowCreate, session: Session = Depends(get_session)):
-    db_flow = session.get(Flow, flow_id)
-    if not db_flow:
+async def update_flow(flow_id: str, flow_update: FlowUpdate, session: AsyncSession = Depends(get_async_session)):
+    row = (await session.exec(
+        select(Flow.version, Flow.name, Flow.description, Flow.data).where(Flow.id == flow_id)
+    )).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Flow not found")
-    
-    flow_data = flow_update.dict(exclude_unset=True)
-    for key, value in flow_data.items():
-        setattr(db_flow, key, value)
-    
-    db_flow.update_time = datetime.now().isoformat()
-    session.add(db_flow)
-    session.commit()
-    session.refresh(db_flow)
-    return db_flow
+    current = dict(row._mapping)
+    # A client that sends the version it edited gets a 409 instead of overwriting newer changes
+    if flow_update.version is not None and flow_update.version != current["version"]:
+        raise HTTPException(status_code=409, detail=f"Flow is at version {current['version']}, not {flow_update.version}")
+
+    changes = flow_update.dict(exclude_unset=True, exclude={"version"})
+    try:
+        await save_flow(session, flow_id, current, changes)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return await session.get(Flow, flow_id, populate_existing=True)
+
+@router.patch("/{flow_id}/graph", response_model=FlowPatchResponse)
+async def patch_flow_graph(flow_id: str, flow_patch: FlowGraphPatch, session: AsyncSession = Depends(get_async_session)):
+    # Delta save for the editor: the request carries only the change, and the
+    # response only the new version instead of echoing the whole graph
+    if (flow_patch.patch is None) == (flow_patch.diff is None):
+        raise HTTPException(status_code=422, detail="Exactly one of 'patch' or 'diff' is required")
+
+    row = (await session.exec(
+        select(Flow.version, Flow.name, Flow.description, Flow.data).where(Flow.id == flow_id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Flow not found")
+    current = dict(row._mapping)
+    if current["version"] != flow_patch.version:
+        raise HTTPException(status_code=409, detail=f"Flow is at version {current['version']}, not {flow_patch.version}")
+
+    # The patch works on a copy, the read state is still recorded as it was
+    data = copy.deepcopy(current["data"] or {})
+    try:
+        if flow_patch.patch is not None:
+            data = apply_json_patch(data, flow_patch.patch)
+        else:
+            data = apply_graph_diff(data, flow_patch.diff)
+    except PatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    changes = {"data": data}
+    if flow_patch.name is not None:
+        changes["name"] = flow_patch.name
+    if flow_patch.description is not None:
+        changes["description"] = flow_patch.description
+    try:
+        values = await save_flow(session, flow_id, current, changes)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"id": flow_id, "version": values["version"], "update_time": values["update_time"]}
 
 @router.delete("/{flow_id}")
-def delete_flow(flow_id: str, session: Session = Depends(get_session)):
-    flow = session.get(Flow, flow_id)
+async def delete_flow(flow_id: str, session: AsyncSession = Depends(get_async_session)):
+    flow = await session.get(Flow, flow_id)
     if not flow:
         raise HTTPException(status_code=404, detail="Flow not found")
-    session.delete(flow)
-    session.commit()
+    await session.delete(flow)
+    manifests = (await session.exec(select(FlowVersion.manifest).where(FlowVersion.flow_id == flow_id))).all()
+    await session.exec(delete(FlowVersion).where(FlowVersion.flow_id == flow_id))
+    # Chunks may be shared with other flows; only the ones nothing references any more go
+    await prune_chunks(session, manifest_hashes(manifests))
+    await session.commit()
+    executor_cache.invalidate(flow_id)
+    flow_payload_cache.invalidate(flow_id)
+    node_memo.drop(flow_id)
     return {"ok": True}
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from engine.executor_cache import load_executor
+from engine.jobs import job_manager, QueueFull, TERMINAL_STATUSES
+from models import Job
+
+router = APIRouter()
+
+class JobCreate(BaseModel):
+    flow_id: str
+    inputs: Optional[dict] = {}
+    priority: int = 0
+
+class JobResponse(BaseModel):
+    id: str
+    flow_id: str
+    status: str
+    priority: int
+    result: Optional[dict]
+    error: Optional[str]
+    create_time: Optional[str]
+    start_time: Optional[str]
+    finish_time: Optional[str]
+    # Cancellation of a running job is asynchronous: its worker acts on the flag
+    cancel_requested: bool = False
+
+def job_payload(job: Job) -> Dict[str, Any]:
+    return JobResponse.model_validate(job, from_attributes=True).model_dump()
+
+@router.post("/", response_model=JobResponse)
+async def submit_job(job_create: JobCreate):
+    if await load_executor(job_create.flow_id) is None:
+        raise HTTPException(status_code=404, detail="Flow not found")
+    inputs = dict(job_create.inputs or {})
+    # Same convention as chat/batch: a plain input text feeds the input node
+    for key in ("input", "message"):
+        if key in inputs and "input_value" not in inputs:
+            inputs["input_value"] = inputs["text"] = str(inputs[key])
+    try:
+        return await job_manager.submit(job_create.flow_id, inputs, job_create.priority)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def read_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.delete("/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    job = await job_manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.websocket("/{job_id}/ws")
+async def job_updates(websocket: WebSocket, job_id: str):
+    # Push every status change until the job reaches a terminal state
+    await websocket.accept()
+    queue = job_manager.subscribe(job_id)
+    try:
+        job = await job_manager.get(job_id)
+        if job is None:
+            await websocket.send_json({"category": "error", "message": {"status_code": 404, "message": "Job not found"}})
+            await websocket.close()
+            return
+        last_status = None
+        while True:
+            if job.status != last_status:
+                await websocket.send_json({"category": "job", "message": job_payload(job)})
+                last_status = job.status
+            if job.status in TERMINAL_STATUSES:
+                break
+            job = await queue.get()
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job_manager.unsubscribe(job_id, queue)
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+from engine.admission import admission
+from engine.jobs import job_manager
+from engine.llm_cache import llm_cache
+from engine.memo import node_memo
+from engine.singleflight import llm_flights
+from engine.tracing import trace_store
+from flow_cache import flow_payload_cache
+import startup
+
+router = APIRouter()
+
+@router.get("/stats")
+def get_runtime_stats():
+    # Runtime counters of the flow engine
+    return {
+        "status_code": 200,
+        "status_message": "success",
+        "data": {
+            "llm_cache": llm_cache.stats(),
+            "llm_admission": admission.stats(),
+            "llm_coalescing": llm_flights.stats(),
+            "node_memo": node_memo.stats(),
+            "flow_payloads": flow_payload_cache.stats(),
+            "jobs": job_manager.stats()
+        }
+    }
+
+@router.get("/startup")
+def get_startup_report():
+    # Boot time, memory and which heavy modules / node types this worker has loaded
+    return {
+        "status_code": 200,
+        "status_message": "success",
+        "data": startup.report()
+    }
+
+@router.get("/traces")
+def list_traces(flow_id: Optional[str] = None, limit: int = 50):
+    # Most recent runs first, optionally for one flow
+    return {
+        "status_code": 200,
+        "status_message": "success",
+        "data": [trace.to_dict() for trace in trace_store.list(flow_id, limit)]
+    }
+
+@router.get("/traces/{run_id}")
+def read_trace(run_id: str):
+    trace = trace_store.get(run_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {
+        "status_code": 200,
+        "status_message": "success",
+        "data": trace.to_dict()
+    }
@@ -0,0 +1,118 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+from pydantic import BaseModel
+from database import get_async_session
+from models import Flow, FlowVersion
+from versioning import VersionConflict, diff_manifests, get_version, load_graph, save_flow
+
+router = APIRouter()
+
+MAX_VERSIONS_PAGE = 200
+
+class FlowVersionSummary(BaseModel):
+    version: int
+    name: Optional[str]
+    description: Optional[str]
+    node_count: int
+    create_time: Optional[str]
+
+class FlowVersionResponse(BaseModel):
+    flow_id: str
+    version: int
+    name: Optional[str]
+    description: Optional[str]
+    data: dict
+    create_time: Optional[str]
+
+class FlowVersionDiff(BaseModel):
+    flow_id: str
+    from_version: int
+    to_version: int
+    nodes: dict
+    edges_changed: bool
+    other_changed: bool
+
+class FlowRestoreResponse(BaseModel):
+    id: str
+    version: int
+    restored_from: int
+    update_time: Optional[str]
+
+async def load_version_graph(session: AsyncSession, flow_version: FlowVersion) -> dict:
+    try:
+        return await load_graph(session, flow_version.manifest)
+    except LookupError as e:
+        # Chunks are shared and pruned by reference; a missing one means the history is damaged
+        raise HTTPException(status_code=410, detail=f"Flow version {flow_version.version} is no longer available: {e}")
+
+async def require_version(session: AsyncSession, flow_id: str, version: int) -> FlowVersion:
+    flow_version = await get_version(session, flow_id, version)
+    if not flow_version:
+        raise HTTPException(status_code=404, detail="Flow version not found")
+    return flow_version
+
+@router.get("/{flow_id}/versions", response_model=List[FlowVersionSummary])
+async def list_versions(flow_id: str, limit: int = Query(50, ge=1, le=MAX_VERSIONS_PAGE), before: Optional[int] = None,
+                        session: AsyncSession = Depends(get_async_session)):
+    # Newest first; `before` pages further back
+    query = select(FlowVersion).where(FlowVersion.flow_id == flow_id)
+    if before is not None:
+        query = query.where(FlowVersion.version < before)
+    rows = (await session.exec(query.order_by(FlowVersion.version.desc()).limit(limit))).all()
+    return [
+        {
+            "version": row.version,
+            "name": row.name,
+            "description": row.description,
+            "node_count": len((row.manifest or {}).get("nodes", [])),
+            "create_time": row.create_time,
+        }
+        for row in rows
+    ]
+
+@router.get("/{flow_id}/versions/{version}", response_model=FlowVersionResponse)
+async def read_version(flow_id: str, version: int, session: AsyncSession = Depends(get_async_session)):
+    flow_version = await require_version(session, flow_id, version)
+    return {
+        "flow_id": flow_id,
+        "version": version,
+        "name": flow_version.name,
+        "description": flow_version.description,
+        "data": await load_version_graph(session, flow_version),
+        "create_time": flow_version.create_time,
+    }
+
+@router.get("/{flow_id}/versions/{version}/diff", response_model=FlowVersionDiff)
+async def diff_version(flow_id: str, version: int, against: Optional[int] = None,
+                       session: AsyncSession = Depends(get_async_session)):
+    # Changes from `against` (default: the previous version) to `version`
+    if against is None:
+        against = version - 1
+    new = await require_version(session, flow_id, version)
+    old = await require_version(session, flow_id, against)
+    return {
+        "flow_id": flow_id,
+        "from_version": against,
+        "to_version": version,
+        **diff_manifests(old.manifest, new.manifest),
+    }
+
+@router.post("/{flow_id}/versions/{version}/restore", response_model=FlowRestoreResponse)
+async def restore_version(flow_id: str, version: int, session: AsyncSession = Depends(get_async_session)):
+    # Restoring is a new save with the old content, so history stays linear
+    flow_version = await require_version(session, flow_id, version)
+    row = (await session.exec(
+        select(Flow.version, Flow.name, Flow.description, Flow.data).where(Flow.id == flow_id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Flow not found")
+
+    data = await load_version_graph(session, flow_version)
+    changes = {"data": data, "name": flow_version.name, "description": flow_version.description}
+    try:
+        values = await save_flow(session, flow_id, dict(row._mapping), changes)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"id": flow_id, "version": values["version"], "restored_from": version, "update_time": values["update_time"]}
@@ -0,0 +1,45 @@
+import logging
+import re
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Set at startup; without FTS5 in the sqlite build the flow list falls back to LIKE
+FTS_ENABLED = False
+
+# External-content FTS5 index over flow name/description. Triggers keep it in sync
+# with every insert/update/delete on `flow`, whichever code path writes the row.
+FLOW_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS flow_fts USING fts5(
+        name, description, content='flow', content_rowid='rowid', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS flow_fts_ai AFTER INSERT ON flow BEGIN
+        INSERT INTO flow_fts(rowid, name, description) VALUES (new.rowid, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS flow_fts_ad AFTER DELETE ON flow BEGIN
+        INSERT INTO flow_fts(flow_fts, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS flow_fts_au AFTER UPDATE OF name, description ON flow BEGIN
+        INSERT INTO flow_fts(flow_fts, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+        INSERT INTO flow_fts(rowid, name, description) VALUES (new.rowid, new.name, new.description);
+    END""",
+]
+
+def create_search_index(engine):
+    global FTS_ENABLED
+    try:
+        with engine.begin() as conn:
+            for statement in FLOW_FTS_DDL:
+                conn.execute(text(statement))
+            # Rebuild from `flow` on boot: covers rows written before the index
+            # existed and rowids renumbered by a manual VACUUM
+            conn.execute(text("INSERT INTO flow_fts(flow_fts) VALUES ('rebuild')"))
+        FTS_ENABLED = True
+    except Exception as e:
+        logger.warning(f"Full-text search disabled: {e}")
+        FTS_ENABLED = False
+
+def match_expression(query: str) -> str:
+    # Every word must match, each as a prefix: "cust sup" -> "cust"* "sup"*
+    tokens = re.findall(r"\w+", query)
+    return " ".join(f'"{token}"*' for token in tokens)
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+from typing import Any, Dict, Optional
+
+# Worker boot report: import time, time to ready and memory, so startup cost per
+# worker stays visible when scaling out. Imported first thing in main.py.
+_started = time.perf_counter()
+_marks: Dict[str, Dict[str, Any]] = {}
+
+# Modules worth knowing about when they show up in a worker
+HEAVY_MODULES = ("litellm", "openai", "tiktoken", "tokenizers", "sqlalchemy", "pydantic", "httpx")
+
+def rss_bytes() -> Optional[int]:
+    # Current resident set size; Linux only, None elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+def peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def mark(name: str):
+    _marks[name] = {
+        "elapsed_ms": round((time.perf_counter() - _started) * 1000, 3),
+        "rss_bytes": rss_bytes(),
+        "modules": len(sys.modules),
+    }
+
+def report() -> Dict[str, Any]:
+    from engine.nodes import loaded_node_types
+    return {
+        "pid": os.getpid(),
+        "marks": dict(_marks),
+        "rss_bytes": rss_bytes(),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "modules": len(sys.modules),
+        "heavy_modules": {name: name in sys.modules for name in HEAVY_MODULES},
+        "node_types_loaded": loaded_node_types(),
+    }
@@ -0,0 +1,166 @@
+import hashlib
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import orjson
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import bindparam, text
+from sqlmodel import select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from engine.executor_cache import executor_cache
+from flow_cache import flow_payload_cache
+from models import Flow, FlowChunk, FlowVersion
+
+# Flow version history with content-addressed storage. A version's graph is
+# split into chunks (one per node, one for the edge list, one for any other
+# keys of `data`); chunks are keyed by the hash of their content, so a node
+# that did not change between versions is stored once. A version row only
+# holds the manifest of chunk hashes.
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+_BATCH = 500
+
+def _canonical(obj: Any) -> bytes:
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+def split_graph(data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, bytes]]:
+    # -> (manifest, {hash: canonical JSON}) for one graph
+    chunks: Dict[str, bytes] = {}
+
+    def add(obj: Any) -> str:
+        raw = _canonical(obj)
+        digest = hashlib.sha256(raw).hexdigest()
+        chunks[digest] = raw
+        return digest
+
+    nodes = data.get("nodes") or []
+    rest = {key: value for key, value in data.items() if key not in ("nodes", "edges")}
+    manifest = {
+        "nodes": [[node.get("id"), add(node)] for node in nodes],
+        "edges": add(data.get("edges") or []),
+        "rest": add(rest),
+    }
+    return manifest, chunks
+
+def _manifest_hashes(manifest: Dict[str, Any]) -> List[str]:
+    return [digest for _, digest in manifest.get("nodes", [])] + [manifest["edges"], manifest["rest"]]
+
+def _batches(items: List[str]) -> Iterable[List[str]]:
+    for start in range(0, len(items), _BATCH):
+        yield items[start:start + _BATCH]
+
+async def record_version(session: AsyncSession, flow_id: str, version: int, name: Optional[str],
+                         description: Optional[str], data: Optional[Dict[str, Any]]) -> bool:
+    # Adds the version in the caller's transaction; a version already recorded is left alone
+    existing = (await session.exec(
+        select(FlowVersion.id).where(FlowVersion.flow_id == flow_id, FlowVersion.version == version)
+    )).first()
+    if existing is not None:
+        return False
+
+    manifest, chunks = split_graph(data or {})
+    hashes = list(chunks)
+    known = set()
+    for batch in _batches(hashes):
+        known.update((await session.exec(select(FlowChunk.hash).where(FlowChunk.hash.in_(batch)))).all())
+    now = datetime.now().isoformat()
+    new_chunks = [
+        {"hash": digest, "data": zlib.compress(chunks[digest], 6), "size": len(chunks[digest]), "create_time": now}
+        for digest in hashes if digest not in known
+    ]
+    # INSERT OR IGNORE: a concurrent save may store the same chunk or version first
+    if new_chunks:
+        await session.exec(sqlite_insert(FlowChunk).values(new_chunks).on_conflict_do_nothing())
+    await session.exec(sqlite_insert(FlowVersion).values(
+        flow_id=flow_id, version=version, name=name, description=description,
+        manifest=manifest, create_time=now
+    ).on_conflict_do_nothing())
+    return True
+
+class VersionConflict(Exception):
+    pass
+
+async def save_flow(session: AsyncSession, flow_id: str, current: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    # Every save of a stored flow goes through here. `current` holds the row as it
+    # was read (version, name, description, data). The write is a compare-and-set
+    # on that version, so a concurrent save between the read and this write raises
+    # VersionConflict instead of being overwritten. Commits and returns the saved values.
+    version = current["version"] or 1
+    # Flows saved before history existed get their current state recorded first
+    await record_version(session, flow_id, version, current["name"], current["description"], current["data"])
+
+    values = {key: current[key] for key in ("name", "description", "data")}
+    values.update(changes)
+    values["version"] = version + 1
+    values["update_time"] = datetime.now().isoformat()
+    outcome = await session.exec(
+        update(Flow).where(Flow.id == flow_id, Flow.version == current["version"]).values(**values)
+    )
+    if outcome.rowcount != 1:
+        await session.rollback()
+        raise VersionConflict("Flow was modified concurrently")
+    await record_version(session, flow_id, values["version"], values["name"], values["description"], values["data"])
+    await session.commit()
+
+    executor_cache.invalidate(flow_id)
+    flow_payload_cache.invalidate(flow_id)
+    return values
+
+async def get_version(session: AsyncSession, flow_id: str, version: int) -> Optional[FlowVersion]:
+    return (await session.exec(
+        select(FlowVersion).where(FlowVersion.flow_id == flow_id, FlowVersion.version == version)
+    )).first()
+
+async def load_graph(session: AsyncSession, manifest: Dict[str, Any]) -> Dict[str, Any]:
+    # Rebuild a version's `data`: one query per 500 distinct chunks, then decompress
+    hashes = list(dict.fromkeys(_manifest_hashes(manifest)))
+    decoded: Dict[str, Any] = {}
+    for batch in _batches(hashes):
+        rows = (await session.exec(select(FlowChunk.hash, FlowChunk.data).where(FlowChunk.hash.in_(batch)))).all()
+        for digest, blob in rows:
+            decoded[digest] = orjson.loads(zlib.decompress(blob))
+    missing = [digest for digest in hashes if digest not in decoded]
+    if missing:
+        raise LookupError(f"Missing chunks: {missing[:3]}")
+
+    data = dict(decoded[manifest["rest"]])
+    # Shared chunks (identical nodes) decode once; copy so each list entry is its own dict
+    data["nodes"] = [dict(decoded[digest]) for _, digest in manifest.get("nodes", [])]
+    data["edges"] = decoded[manifest["edges"]]
+    return data
+
+# Every chunk hash some manifest still points to
+_REFERENCED_CHUNKS = """
+    SELECT json_extract(node.value, '$[1]') FROM flowversion, json_each(flowversion.manifest, '$.nodes') AS node
+    UNION SELECT json_extract(manifest, '$.edges') FROM flowversion
+    UNION SELECT json_extract(manifest, '$.rest') FROM flowversion
+"""
+
+def manifest_hashes(manifests: Iterable[Dict[str, Any]]) -> List[str]:
+    return list(dict.fromkeys(digest for manifest in manifests if manifest for digest in _manifest_hashes(manifest)))
+
+async def prune_chunks(session: AsyncSession, candidates: List[str]) -> int:
+    # Deletes those of `candidates` that no remaining version references, in the
+    # caller's transaction; call it after the versions that used them are gone
+    statement = text(
+        f"DELETE FROM flowchunk WHERE hash IN :hashes AND hash NOT IN ({_REFERENCED_CHUNKS})"
+    ).bindparams(bindparam("hashes", expanding=True))
+    removed = 0
+    for batch in _batches(candidates):
+        removed += (await session.exec(statement, params={"hashes": batch})).rowcount
+    return removed
+
+def diff_manifests(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    # Compares chunk hashes only; no chunk has to be loaded
+    old_nodes = dict((node_id, digest) for node_id, digest in old.get("nodes", []))
+    new_nodes = dict((node_id, digest) for node_id, digest in new.get("nodes", []))
+    return {
+        "nodes": {
+            "added": [node_id for node_id in new_nodes if node_id not in old_nodes],
+            "removed": [node_id for node_id in old_nodes if node_id not in new_nodes],
+            "changed": [node_id for node_id, digest in new_nodes.items()
+                        if node_id in old_nodes and old_nodes[node_id] != digest],
+        },
+        "edges_changed": old.get("edges") != new.get("edges"),
+        "other_changed": old.get("rest") != new.get("rest"),
+    }